@@ -151,15 +151,8 @@ def food(state):
     #
     # In both cases, walls block the view.
     
-    foodList= []
-    foodGrid = state.getFood()
-    width = foodGrid.width
-    height = foodGrid.height
-    for i in range(width):
-        for j in range(height):
-            if foodGrid[i][j] == True:
-                foodList.append((i, j))
-            
+    foodList = state.getFood().asList()
+
     # Return list of food that is visible
     return visible(foodList, state)
 
@@ -170,15 +163,7 @@ def walls(state):
     # extracted from the state data.  In later versions, this will be
     # restricted by distance, and include some uncertainty.
     
-    wallList= []
-    wallGrid = state.getWalls()
-    width = wallGrid.width
-    height = wallGrid.height
-    for i in range(width):
-        for j in range(height):
-            if wallGrid[i][j] == True:
-                wallList.append((i, j))            
-    return wallList
+    return state.getWalls().asList()
 
 def corners(state):
     # Returns the coordinates of the four corners of the state space.
@@ -257,126 +242,78 @@ def distanceLimited(objects, state, limit):
 
     return nearObjects
 
+def sightLines(state):
+    # Returns, for each of the four directions, the cells Pacman can
+    # see along the corridor in that direction, nearest first, before
+    # a wall gets in the way.
+    #
+    # These come from an index that the layout builds once (see
+    # Layout.getSightLines), so sensing does not walk the corridors
+    # on every query.
+
+    return state.data.layout.getSightLines()[state.getPacmanPosition()]
+
+# The side corridors of each direction Pacman can be facing.
+sides = {Directions.NORTH: [Directions.WEST, Directions.EAST],
+         Directions.SOUTH: [Directions.WEST, Directions.EAST],
+         Directions.EAST: [Directions.NORTH, Directions.SOUTH],
+         Directions.WEST: [Directions.NORTH, Directions.SOUTH]}
+
 def inFront(object, facing, state):
     # Returns true if the object is along the corridor in the
     # direction of the parameter "facing" before a wall gets in the
     # way.
-    
-    pacman = state.getPacmanPosition()
-    pacman_x = pacman[0]
-    pacman_y = pacman[1]
-    wallList = walls(state)
-
-    # If Pacman is facing North
-    if facing == Directions.NORTH:
-        # Check if the object is anywhere due North of Pacman before a
-        # wall intervenes.
-        next = (pacman_x, pacman_y + 1)
-        while not next in wallList:
-            if next == object:
-                return True
-            else:
-                next = (pacman_x, next[1] + 1)
-        return False
 
-    # If Pacman is facing South
-    if facing == Directions.SOUTH:
-        # Check if the object is anywhere due North of Pacman before a
-        # wall intervenes.
-        next = (pacman_x, pacman_y - 1)
-        while not next in wallList:
-            if next == object:
-                return True
-            else:
-                next = (pacman_x, next[1] - 1)
-        return False
-
-    # If Pacman is facing East
-    if facing == Directions.EAST:
-        # Check if the object is anywhere due East of Pacman before a
-        # wall intervenes.
-        next = (pacman_x + 1, pacman_y)
-        while not next in wallList:
-            if next == object:
-                return True
-            else:
-                next = (next[0] + 1, pacman_y)
-        return False
-    
-    # If Pacman is facing West
-    if facing == Directions.WEST:
-        # Check if the object is anywhere due West of Pacman before a
-        # wall intervenes.
-        next = (pacman_x - 1, pacman_y)
-        while not next in wallList:
-            if next == object:
-                return True
-            else:
-                next = (next[0] - 1, pacman_y)
+    if facing not in sides:
         return False
+    return object in sightLines(state)[facing]
 
 def atSide(object, facing, state):
     # Returns true if the object is in a side corridor perpendicular
     # to the direction that Pacman is travelling.
-    
-    pacman = state.getPacmanPosition()
-
-    # If Pacman is facing North or Sout, then objects to the side are to the
-    # East and West.
     #
-    # These are objects that Pacman would see if it were facing East
-    # or West.
-    
-    if facing == Directions.NORTH or facing == Directions.SOUTH:
-        # Check if the object is anywhere due North of Pacman before a
-        # wall intervenes.
-       if inFront(object, Directions.WEST, state) or inFront(object, Directions.EAST, state):
-                return True
-       else:
-                return False
-            
-    # Similarly for other directions
-    if facing == Directions.WEST or facing == Directions.EAST:
-        # Check if the object is anywhere due North of Pacman before a
-        # wall intervenes.
-       if inFront(object, Directions.NORTH, state) or inFront(object, Directions.SOUTH, state):
-                return True
-       else:
-                return False
+    # If Pacman is facing North or South, then objects to the side are
+    # to the East and West, and similarly for the other directions.
+    # These are objects that Pacman would see if it were facing that
+    # way.
 
-    else:
+    if facing not in sides:
         return False
-    
+    lines = sightLines(state)
+    for side in sides[facing]:
+        if object in lines[side]:
+            return True
+    return False
+
 def visible(objects, state):
     # When passed a list of objects, returns those that are visible to
     # Pacman.
 
+    # If we return visibleObjects, we have partial observability. If
+    # we return objects, then we have full observability.
+    if not partialVisibility:
+        return objects
+
     # This code creates partial observability by only returning some
-    # of the members of objects.
+    # of the members of objects. The cells Pacman can see are read off
+    # the sight lines, cut to the distance limits: the k-th cell along
+    # a corridor is k steps away.
     facing = state.getPacmanState().configuration.direction
-    visibleObjects = []
-    sideObjects = []
-    
+    lines = sightLines(state)
+
     if facing != Directions.STOP:
-    
+
         # If Pacman is moving, visible objects are those in front of,
-        # and to the side (if there are any side corridors).
-
-        # Objects in front. Visible up to "visibilityLimit"
-        for i in range(len(objects)):
-            if inFront(objects[i], facing, state):
-                visibleObjects.append(objects[i])
-        visibleObjects = distanceLimited(visibleObjects, state, visibilityLimit)
-        
-        # Objects to the side. Visible up to "sideLimit"
-        for i in range(len(objects)):
-            if atSide(objects[i], facing, state):
-                sideObjects.append(objects[i])
-        sideObjects = distanceLimited(sideObjects, state, sideLimit)
+        # up to "visibilityLimit", and to the side (if there are any
+        # side corridors), up to "sideLimit".
+        front = set(lines[facing][:int(visibilityLimit)])
+        side = set()
+        for direction in sides[facing]:
+            side.update(lines[direction][:int(sideLimit)])
 
         # Combine lists.
-        visibleObjects = visibleObjects + sideObjects
-        
+        return [object for object in objects if object in front] + [object for object in objects if object in side]
+
     else:
 
         # If Pacman is not moving, they can see in all directions.
@@ -384,24 +321,10 @@ def visible(objects, state):
         # Unfortunately facing will never have value Directions.STOP
         # after the first move is made, so this code will not run
         # after the first move :-(
-
-        for i in range(len(objects)):
-            if inFront(objects[i], Directions.NORTH, state):
-                visibleObjects.append(objects[i])
-            if inFront(objects[i], Directions.SOUTH, state):
-                visibleObjects.append(objects[i])
-            if inFront(objects[i], Directions.EAST, state):
-                visibleObjects.append(objects[i])
-            if inFront(objects[i], Directions.WEST, state):
-                visibleObjects.append(objects[i])
-        visibleObjects = distanceLimited(visibleObjects, state, visibilityLimit)
-
-    # If we return visibleObjects, we have partial observability. If
-    # we return objects, then we have full observability.
-    if partialVisibility:
-        return visibleObjects
-    else:
-        return objects
+        seen = set()
+        for direction in sides.keys():
+            seen.update(lines[direction][:int(visibilityLimit)])
+        return [object for object in objects if object in seen]
 
 def audible(ghosts, state):
     # A ghost is audible if it is any direction and less than
@@ -0,0 +1,176 @@
+# batchRunner.py
+# --------------
+# Plays many quiet games in parallel.
+#
+# pacman.runGames plays one game after another in a single process. The
+# batch runner fans the games out across a multiprocessing pool instead:
+# every worker builds the layout, Pacman and the ghosts of a game spec once
+# and then plays the games of that spec it is handed with NullGraphics.
+# Each game is seeded from a master seed, so a batch replays identically
+# whatever the number of workers. Results are printed as the games finish, and the summary is
+# printed exactly as runGames prints it:
+#
+#   python batchRunner.py -p MDPAgent -l mediumClassic -n 200 --seed 7
+#
+# Graphics are never imported: only textDisplay.NullGraphics is used.
+
+import multiprocessing
+import random
+import sys
+import time
+
+import layout
+import pacman
+import textDisplay
+import util
+
+# the layout, agents and rules of this worker process, one entry per game spec played in it (see workerFor)
+_WORKERS = {}
+
+def gameSpec(layoutName='mediumClassic', pacmanType='MDPAgent', agentArgs=None, ghostType='RandomGhost', numGhosts=4, timeout=30, catchExceptions=False, fastMode=False, moveTimeout=None):
+    """
+    Describes the games of a batch with plain (picklable) values, so that
+    every worker can rebuild the same layout and agents for itself.
+    """
+    return {'layout': layoutName, 'pacman': pacmanType, 'agentArgs': agentArgs, 'ghost': ghostType,
+            'numGhosts': numGhosts, 'timeout': timeout, 'catchExceptions': catchExceptions, 'fastMode': fastMode,
+            'moveTimeout': moveTimeout}
+
+def gameSeeds(seed, numGames):
+    "The seed of every game of a batch, derived from the master seed."
+    generator = random.Random(seed)
+    return [generator.getrandbits(32) for i in range(numGames)]
+
+def workerFor(spec):
+    """
+    The layout, Pacman, the ghosts and the rules of spec in this process,
+    built the first time a game of spec is played here and reused after.
+    """
+    key = tuple(sorted(spec.items()))
+    if key not in _WORKERS:
+        board = layout.getLayout(spec['layout'])
+        if board == None: raise Exception("The layout " + spec['layout'] + " cannot be found")
+        pacmanType = pacman.loadAgent(spec['pacman'], True)
+        agent = pacmanType(**pacman.parseAgentArgs(spec['agentArgs']))
+        ghostType = pacman.loadAgent(spec['ghost'], True)
+        ghosts = [ghostType(i + 1) for i in range(spec['numGhosts'])]
+        rules = pacman.ClassicGameRules(spec['timeout'], spec.get('moveTimeout'))
+        rules.quiet = True
+        _WORKERS[key] = (board, agent, ghosts, rules, spec['catchExceptions'], spec.get('fastMode', False))
+    return _WORKERS[key]
+
+def initializeWorker(spec=None):
+    "Builds the layout, agents and rules of spec ahead of its first game in this worker."
+    if spec != None: workerFor(spec)
+
+def playGame(task):
+    """
+    Plays one quiet game in this worker. The task is (spec, game index,
+    seed); the result is (game index, seed, score, win, moves, seconds).
+    """
+    spec, index, seed = task
+    board, agent, ghosts, rules, catchExceptions, fastMode = workerFor(spec)
+    random.seed(seed)
+    util.mutePrint()
+    try:
+        start = time.time()
+        game = rules.newGame(board, agent, ghosts, textDisplay.NullGraphics(), True, catchExceptions, fastMode)
+        game.run()
+        elapsed = time.time() - start
+    finally:
+        util.unmutePrint()
+    return (index, seed, game.state.getScore(), game.state.isWin(), len(game.moveHistory), elapsed)
+
+def playLabelledGame(task):
+    "Plays the task (label, spec, game index, seed) and returns (label, result), for pools that mix specs."
+    return (task[0], playGame(task[1:]))
+
+def createPool(workers=None, numTasks=None, spec=None):
+    """
+    A pool of workers (one per CPU by default) that can play games of any
+    spec, or None when a single worker is enough and the games should be
+    played in this process. spec, if given, is built in every worker ahead
+    of the first task.
+    """
+    if workers == None:
+        workers = multiprocessing.cpu_count()
+    if numTasks != None:
+        workers = min(workers, numTasks)
+    if workers <= 1:
+        return None
+    return multiprocessing.Pool(workers, initializeWorker, (spec,))
+
+def playTasks(pool, function, tasks):
+    "Yields the results of function (playGame or playLabelledGame) over the tasks as they finish."
+    if pool == None:
+        return (function(task) for task in tasks)
+    return pool.imap_unordered(function, tasks)
+
+def runBatch(spec, numGames, seed=0, workers=None, callback=None, start=0):
+    """
+    Plays numGames games of spec across a pool of workers (one per CPU by
+    default; a single worker plays in this process), starting at game index
+    start of the master seed's sequence. callback, if given, receives every
+    result as soon as its game finishes. Returns the results in game order.
+    """
+    seeds = gameSeeds(seed, start + numGames)
+    tasks = [(spec, index, seeds[index]) for index in range(start, start + numGames)]
+    results = [None] * numGames
+    pool = createPool(workers, numGames, spec)
+    try:
+        for result in playTasks(pool, playGame, tasks):
+            results[result[0] - start] = result
+            if callback != None: callback(result)
+    except:
+        if pool != None: pool.terminate()
+        raise
+    if pool != None:
+        pool.close()
+        pool.join()
+    return results
+
+def printResult(result, numGames):
+    "Prints one finished game."
+    index, seed, score, win, moves, seconds = result
+    print 'Game %d/%d (seed %d): %s, score %s, %d moves, %.2fs' % (index + 1, numGames, seed, ['Loss', 'Win'][int(win)], score, moves, seconds)
+    sys.stdout.flush()
+
+def readCommand(argv):
+    from optparse import OptionParser
+    parser = OptionParser('USAGE: python batchRunner.py <options>')
+    parser.add_option('-n', '--numGames', dest='numGames', type='int',
+                      help=pacman.default('the number of GAMES to play'), metavar='GAMES', default=100)
+    parser.add_option('-l', '--layout', dest='layout',
+                      help=pacman.default('the LAYOUT_FILE from which to load the map layout'), metavar='LAYOUT_FILE', default='mediumClassic')
+    parser.add_option('-p', '--pacman', dest='pacman',
+                      help=pacman.default('the agent TYPE in the pacmanAgents module to use'), metavar='TYPE', default='MDPAgent')
+    parser.add_option('-a', '--agentArgs', dest='agentArgs',
+                      help='Comma separated values sent to agent. e.g. "opt1=val1,opt2,opt3=val3"')
+    parser.add_option('-g', '--ghosts', dest='ghost',
+                      help=pacman.default('the ghost agent TYPE in the ghostAgents module to use'), metavar='TYPE', default='RandomGhost')
+    parser.add_option('-k', '--numghosts', type='int', dest='numGhosts',
+                      help=pacman.default('The maximum number of ghosts to use'), default=4)
+    parser.add_option('-s', '--seed', dest='seed', type='int',
+                      help=pacman.default('the master seed every game seed is derived from'), default=0)
+    parser.add_option('-w', '--workers', dest='workers', type='int',
+                      help='the number of worker processes [Default: one per CPU]', default=None)
+    parser.add_option('-c', '--catchExceptions', action='store_true', dest='catchExceptions',
+                      help='Turns on exception handling and timeouts during games', default=False)
+    parser.add_option('--timeout', dest='timeout', type='int',
+                      help=pacman.default('Maximum length of time an agent can spend computing in a single game'), default=30)
+    parser.add_option('--moveTimeout', dest='moveTimeout', type='int',
+                      help='Maximum length of time in milliseconds an agent can spend on a single move [Default: the game timeout]', default=None)
+    parser.add_option('--fast', action='store_true', dest='fastMode',
+                      help='Trusted agents: hand them copy-on-write states instead of deep copies (see Game.runFast)', default=False)
+    options, otherjunk = parser.parse_args(argv)
+    if len(otherjunk) != 0:
+        raise Exception('Command line input not understood: ' + str(otherjunk))
+    return options
+
+if __name__ == '__main__':
+    options = readCommand(sys.argv[1:])
+    spec = gameSpec(options.layout, options.pacman, options.agentArgs, options.ghost, options.numGhosts, options.timeout, options.catchExceptions, options.fastMode, options.moveTimeout)
+    start = time.time()
+    results = runBatch(spec, options.numGames, options.seed, options.workers, lambda result: printResult(result, options.numGames))
+    pacman.printSummary([result[2] for result in results], [result[3] for result in results])
+    print 'Wall time:     %.1fs' % (time.time() - start)
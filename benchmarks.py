@@ -0,0 +1,658 @@
+# benchmarks.py
+# -------------
+# Timing benchmarks for the MDP agent and the game engine.
+#
+# Each benchmark replays the same recorded game states (or layouts) under
+# several configurations and prints one row per configuration:
+#
+#   python benchmarks.py --benchmark updateModes --layout mediumClassic
+
+import random
+import sys
+import time
+
+import layout
+import mdpAgents
+import mdpSolvers
+import pacman
+import textDisplay
+import util
+from game import Agent
+from ghostAgents import RandomGhost
+
+class RecordingAgent(Agent):
+    """
+    Wraps a Pacman agent and records every state it is asked to act in.
+    """
+    def __init__(self, agent):
+        self.agent = agent
+        self.initialState = None
+        self.states = []
+
+    def registerInitialState(self, state):
+        self.initialState = state
+        self.agent.registerInitialState(state)
+
+    def getAction(self, state):
+        self.states.append(state)
+        return self.agent.getAction(state)
+
+def recordStates(layoutName, seed, numMoves):
+    """
+    Plays one quiet game with the default MDPAgent and returns the initial
+    state together with (at most numMoves of) the states Pacman acted in.
+    """
+    random.seed(seed)
+    board = layout.getLayout(layoutName)
+    recorder = RecordingAgent(mdpAgents.MDPAgent())
+    ghosts = [RandomGhost(i + 1) for i in range(board.getNumGhosts())]
+    rules = pacman.ClassicGameRules()
+    game = rules.newGame(board, recorder, ghosts, textDisplay.NullGraphics(), quiet=True)
+    util.mutePrint()
+    try:
+        game.run()
+    finally:
+        util.unmutePrint()
+    return recorder.initialState, recorder.states[:numMoves]
+
+def timeMoves(agent, initialState, states):
+    "Returns the mean wall time in seconds of agent.getAction over the states."
+    util.mutePrint()
+    try:
+        agent.registerInitialState(initialState)
+        start = time.time()
+        for state in states:
+            agent.getAction(state)
+        elapsed = time.time() - start
+    finally:
+        util.unmutePrint()
+    return elapsed / max(1, len(states))
+
+def meanStatistic(agent, key):
+    "Averages one of the per-move statistics an MDPAgent collected."
+    statistics = agent.getStatistics()
+    return sum([entry[key] for entry in statistics]) / float(len(statistics))
+
+def benchmarkUpdateModes(options):
+    """
+    Compares the double-buffered and the in-place (Gauss-Seidel) sweeps of
+    the solvers that have both: wall time, sweeps and utility buffers
+    allocated per move.
+    """
+    initialState, states = recordStates(options.layout, options.seed, options.numMoves)
+    print '%-26s %-14s %10s %8s %12s' % ('solver', 'update_mode', 'ms/move', 'sweeps', 'buffers/move')
+    for solver in mdpSolvers.UPDATE_MODE_SOLVERS:
+        for updateMode in mdpSolvers.UPDATE_MODES:
+            random.seed(options.seed)
+            agent = mdpAgents.MDPAgent(solver=solver, update_mode=updateMode)
+            seconds = timeMoves(agent, initialState, states)
+            print '%-26s %-14s %10.2f %8.1f %12.1f' % (solver, updateMode, 1000 * seconds, meanStatistic(agent, 'sweeps'), meanStatistic(agent, 'allocations'))
+
+def benchmarkWarmStart(options):
+    """
+    Compares solving every move from scratch with seeding each solve by the
+    previous move's utilities: wall time, sweeps and reinitialized floors per move.
+    """
+    initialState, states = recordStates(options.layout, options.seed, options.numMoves)
+    print '%-26s %-10s %10s %8s %14s' % ('solver', 'warm_start', 'ms/move', 'sweeps', 'reinitialized')
+    for solver in [mdpSolvers.CLASSIC_SOLVER] + sorted(mdpSolvers.SOLVERS.keys()):
+        for warmStart in [False, True]:
+            random.seed(options.seed)
+            agent = mdpAgents.MDPAgent(solver=solver, warm_start=warmStart)
+            seconds = timeMoves(agent, initialState, states)
+            print '%-26s %-10s %10.2f %8.1f %14.1f' % (solver, warmStart, 1000 * seconds, meanStatistic(agent, 'sweeps'), meanStatistic(agent, 'reinitialized'))
+
+def benchmarkBackups(options):
+    """
+    Compares the number of Bellman backups every solver performs per move,
+    solving from scratch and warm-started from the previous move.
+    """
+    initialState, states = recordStates(options.layout, options.seed, options.numMoves)
+    print '%-26s %-10s %10s %10s' % ('solver', 'warm_start', 'ms/move', 'backups')
+    for solver in [mdpSolvers.CLASSIC_SOLVER] + sorted(mdpSolvers.SOLVERS.keys()):
+        for warmStart in [False, True]:
+            random.seed(options.seed)
+            agent = mdpAgents.MDPAgent(solver=solver, warm_start=warmStart)
+            seconds = timeMoves(agent, initialState, states)
+            print '%-26s %-10s %10.2f %10.1f' % (solver, warmStart, 1000 * seconds, meanStatistic(agent, 'backups'))
+
+def paddedLayout(padding, size=10):
+    """
+    Returns a Layout with the same size x size room of floors (Pacman, one
+    ghost and food) enclosed by a wall border padding + 1 cells thick.
+    """
+    width = size + 2 * (padding + 1)
+    rows = ['%' * width] * (padding + 1)
+    for y in range(size):
+        row = ['.'] * size
+        if y == 0: row[0] = 'P'
+        if y == size - 1: row[size - 1] = 'G'
+        rows.append('%' * (padding + 1) + ''.join(row) + '%' * (padding + 1))
+    rows += ['%' * width] * (padding + 1)
+    return layout.Layout(rows)
+
+def benchmarkWallScaling(options):
+    """
+    Times a Bellman sweep on rooms with a fixed number of floors and an
+    increasing number of walls: the cost per sweep should stay flat.
+    """
+    print '%-26s %8s %8s %10s' % ('solver', 'walls', 'floors', 'ms/sweep')
+    for solver in [mdpSolvers.CLASSIC_SOLVER] + sorted(mdpSolvers.SOLVERS.keys()):
+        for padding in [0, 10, 20, 40]:
+            board = paddedLayout(padding)
+            state = pacman.GameState()
+            state.initialize(board, board.getNumGhosts())
+            random.seed(options.seed)
+            agent = mdpAgents.MDPAgent(solver=solver)
+            # the first move compiles the layout; only the moves after it are timed
+            timeMoves(agent, state, [state])
+            warmUp = len(agent.getStatistics())
+            seconds = timeMoves(agent, state, [state] * options.numMoves)
+            sweeps = sum([entry['sweeps'] for entry in agent.getStatistics()[warmUp:]]) / float(options.numMoves)
+            print '%-26s %8d %8d %10.4f' % (solver, board.walls.count(), board.width * board.height - board.walls.count(), 1000 * seconds / sweeps)
+
+def timeActions(agent, initialState, states, warmUp=0):
+    """
+    Returns the mean wall time in seconds of agent.getAction over the states
+    together with the actions chosen, with api.nonDeterministic switched off
+    so that every action is the maximum expected utility action itself.
+    The first warmUp moves (e.g. the one that maps the maze) are not timed.
+    """
+    import api
+    nonDeterministic = api.nonDeterministic
+    api.nonDeterministic = False
+    util.mutePrint()
+    try:
+        agent.registerInitialState(initialState)
+        actions = [agent.getAction(state) for state in states[:warmUp]]
+        start = time.time()
+        actions += [agent.getAction(state) for state in states[warmUp:]]
+        elapsed = time.time() - start
+    finally:
+        util.unmutePrint()
+        api.nonDeterministic = nonDeterministic
+    return elapsed / max(1, len(states) - warmUp), actions
+
+def agreement(actions, reference):
+    "The fraction of moves on which two runs chose the same action."
+    return [a == b for a, b in zip(actions, reference)].count(True) / float(max(1, len(reference)))
+
+def benchmarkPolicies(options):
+    """
+    Compares the backups every array solver needs per move and how often
+    its chosen action agrees with the one of vectorized value iteration.
+    """
+    initialState, states = recordStates(options.layout, options.seed, options.numMoves)
+    actions = dict()
+    print '%-26s %10s %10s %10s' % ('solver', 'ms/move', 'backups', 'agreement')
+    for solver in ['vectorized'] + sorted([name for name in mdpSolvers.SOLVERS.keys() if name != 'vectorized']):
+        agent = mdpAgents.MDPAgent(solver=solver)
+        seconds, actions[solver] = timeActions(agent, initialState, states)
+        print '%-26s %10.2f %10.1f %10.2f' % (solver, 1000 * seconds, meanStatistic(agent, 'backups'), agreement(actions[solver], actions['vectorized']))
+
+def benchmarkStopping(options):
+    """
+    Compares stopping rules of the default solver: the total entropy test,
+    the error bound of the Bellman residual and a stable action at Pacman's
+    location. Agreement is measured against a solve to an error bound of 1e-6.
+    """
+    initialState, states = recordStates(options.layout, options.seed, options.numMoves)
+    reference = timeActions(mdpAgents.MDPAgent(error_bound=1e-6), initialState, states)[1]
+    rules = [(None, None), (1e-6, None), (0.1, None), (1.0, None), (10.0, None), (None, 3), (None, 5), (1.0, 3)]
+    print '%-12s %-14s %10s %8s %10s %12s %10s' % ('error_bound', 'stable_sweeps', 'ms/move', 'sweeps', 'max sweeps', 'error bound', 'agreement')
+    for errorBound, stableSweeps in rules:
+        agent = mdpAgents.MDPAgent(error_bound=errorBound, stable_sweeps=stableSweeps)
+        seconds, actions = timeActions(agent, initialState, states)
+        statistics = agent.getStatistics()
+        bound = max([entry['error_bound'] for entry in statistics])
+        print '%-12s %-14s %10.2f %8.1f %10d %12.4g %10.2f' % (errorBound, stableSweeps, 1000 * seconds, meanStatistic(agent, 'sweeps'), max([entry['sweeps'] for entry in statistics]), bound, agreement(actions, reference))
+        if options.verbose:
+            print '    sweeps per move: ' + ' '.join([str(entry['sweeps']) for entry in statistics])
+
+def benchmarkHorizon(options):
+    """
+    Compares value iteration over the whole maze with local-horizon value
+    iteration around Pacman on one or more (comma separated) layouts: the
+    backups per move should stop growing with the size of the maze. The
+    first move, which maps the maze, is not timed.
+    """
+    print '%-16s %8s %-8s %10s %10s %10s %10s' % ('layout', 'floors', 'horizon', 'ms/move', 'backups', 'solved', 'agreement')
+    for layoutName in options.layout.split(','):
+        initialState, states = recordStates(layoutName, options.seed, options.numMoves)
+        floors = len(mdpSolvers.getModel(initialState.data.layout.layoutText, initialState.getWalls()).floors)
+        reference = None
+        for horizon in [None, 4, 8, 12]:
+            agent = mdpAgents.MDPAgent(horizon=horizon)
+            seconds, actions = timeActions(agent, initialState, states, warmUp=1)
+            if reference == None:
+                reference = actions
+            solved = [entry['horizon'] for entry in agent.getStatistics() if entry['horizon'] != None]
+            meanHorizon = '-'
+            if len(solved) > 0:
+                meanHorizon = '%.1f' % (sum(solved) / float(len(solved)))
+            print '%-16s %8d %-8s %10.2f %10.1f %10s %10.2f' % (layoutName, floors, horizon, 1000 * seconds, meanStatistic(agent, 'backups'), meanHorizon, agreement(actions, reference))
+
+def benchmarkSuccessors(options):
+    """
+    Times GameState.generateSuccessor on rooms with a fixed number of floors
+    and an increasing number of walls: with copy-on-write states the cost
+    per successor should stay flat as the board grows.
+    """
+    print '%-10s %8s %12s' % ('cells', 'walls', 'us/successor')
+    for padding in [0, 10, 20, 40]:
+        board = paddedLayout(padding)
+        random.seed(options.seed)
+        state = pacman.GameState()
+        state.initialize(board, board.getNumGhosts())
+        generated = 0
+        start = time.time()
+        for move in range(options.numMoves):
+            for agentIndex in range(state.getNumAgents()):
+                if state.isWin() or state.isLose():
+                    state = pacman.GameState()
+                    state.initialize(board, board.getNumGhosts())
+                successors = [state.generateSuccessor(agentIndex, action) for action in state.getLegalActions(agentIndex)]
+                generated += len(successors)
+                state = random.choice(successors)
+        elapsed = time.time() - start
+        print '%-10d %8d %12.2f' % (board.width * board.height, board.walls.count(), 1e6 * elapsed / generated)
+
+def benchmarkGrids(options):
+    """
+    Compares the list-of-lists Grid with the bitboard BitGrid, as the game's
+    food and frozen as the layout's walls are, on layouts of growing size:
+    microseconds per copy, count, hash, asList and per grid[x][y] and
+    grid.get(x, y) read.
+    """
+    from game import Grid
+    print '%-10s %-8s %8s %8s %8s %8s %8s %8s' % ('cells', 'backend', 'copy', 'count', 'hash', 'asList', 'read', 'get')
+    for padding in [0, 10, 20, 40]:
+        food = paddedLayout(padding).food
+        cells = [(x, y) for x in range(food.width) for y in range(food.height)]
+        random.seed(options.seed)
+        reads = [random.choice(cells) for i in range(1000)]
+        grid = Grid(food.width, food.height)
+        for x, y in food.asList():
+            grid[x][y] = True
+        for name, backend in [('Grid', grid), ('BitGrid', food.copy()), ('frozen', food)]:
+            timings = []
+            for operation in [backend.copy, backend.count, backend.__hash__, backend.asList]:
+                start = time.time()
+                for i in range(options.numMoves):
+                    operation()
+                timings.append(1e6 * (time.time() - start) / options.numMoves)
+            backend[0][0]  # the columns are built by the first read of a grid
+            start = time.time()
+            for x, y in reads:
+                backend[x][y]
+            timings.append(1e6 * (time.time() - start) / len(reads))
+            start = time.time()
+            for x, y in reads:
+                backend.get(x, y)
+            timings.append(1e6 * (time.time() - start) / len(reads))
+            print '%-10d %-8s %8.2f %8.2f %8.2f %8.2f %8.2f %8.2f' % tuple([food.width * food.height, name] + timings)
+
+def benchmarkFoodCount(options):
+    """
+    Times the win check of PacmanRules.consume on rooms full of food: the
+    recount the rules used to do (food.count()) against the counter kept by
+    GameStateData, and a whole consume of one pellet, in microseconds.
+    """
+    print '%-10s %8s %10s %10s %10s' % ('cells', 'food', 'recount', 'counter', 'consume')
+    for size in [10, 30, 50, 90]:
+        board = paddedLayout(0, size)
+        state = pacman.GameState()
+        state.initialize(board, board.getNumGhosts())
+        random.seed(options.seed)
+        pellets = [random.choice(board.food.asList()) for i in range(options.numMoves)]
+        timings = []
+        for count in [state.data.food.count, state.getNumFood]:
+            start = time.time()
+            for i in range(options.numMoves):
+                count()
+            timings.append(1e6 * (time.time() - start) / options.numMoves)
+        start = time.time()
+        for pellet in pellets:
+            pacman.PacmanRules.consume(pellet, pacman.GameState(state))
+        timings.append(1e6 * (time.time() - start) / len(pellets))
+        print '%-10d %8d %10.2f %10.2f %10.2f' % tuple([board.width * board.height, state.getNumFood()] + timings)
+
+def playTurns(board, fastMode, numTurns, seed):
+    """
+    Plays quiet GreedyAgent games on seeds seed, seed + 1, ... until at least
+    numTurns turns were played. Returns (turns, seconds, scores).
+    """
+    from pacmanAgents import GreedyAgent
+    rules = pacman.ClassicGameRules()
+    ghosts = [RandomGhost(i + 1) for i in range(board.getNumGhosts())]
+    turns = 0
+    scores = []
+    start = time.time()
+    while turns < numTurns:
+        random.seed(seed + len(scores))
+        game = rules.newGame(board, GreedyAgent(), ghosts, textDisplay.NullGraphics(), quiet=True, fastMode=fastMode)
+        game.run()
+        turns += len(game.moveHistory)
+        scores.append(game.state.getScore())
+    return turns, time.time() - start, scores
+
+def benchmarkTurns(options):
+    """
+    Turns per second of Game.run and of the fast mode (Game.runFast) on
+    the same seeded GreedyAgent games, at least 20 * numMoves turns each.
+    """
+    print '%-16s %8s %12s %12s %8s' % ('layout', 'turns', 'run', 'runFast', 'same')
+    for layoutName in ['smallClassic', 'mediumClassic', 'originalClassic']:
+        board = layout.getLayout(layoutName)
+        turns, seconds, scores = playTurns(board, False, 20 * options.numMoves, options.seed)
+        fastTurns, fastSeconds, fastScores = playTurns(board, True, 20 * options.numMoves, options.seed)
+        print '%-16s %8d %12.0f %12.0f %8s' % (layoutName, turns, turns / seconds, fastTurns / fastSeconds, scores == fastScores)
+
+def deepSize(obj, seen=None):
+    "Approximate bytes held by obj and everything it references."
+    if seen == None: seen = set()
+    if id(obj) in seen: return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum([deepSize(key, seen) + deepSize(value, seen) for key, value in obj.items()])
+    elif isinstance(obj, (list, tuple, set)):
+        size += sum([deepSize(item, seen) for item in obj])
+    if hasattr(obj, '__dict__'):
+        size += deepSize(obj.__dict__, seen)
+    return size
+
+def benchmarkLayoutCopies(options):
+    """
+    The cost of GameState.deepCopy on the recorded states of --layout when
+    the copy shares the interned Layout and when it re-parses the layout
+    text (as deepCopy used to): microseconds per copy and per turn (Game.run
+    deep copies the state once per agent and turn), and the bytes a copy
+    holds on top of the shared data.
+    """
+    initialState, states = recordStates(options.layout, options.seed, options.numMoves)
+    text = list(initialState.data.layout.layoutText)
+    perTurn = initialState.getNumAgents()
+    print '%-10s %12s %12s %12s' % ('Layout', 'us/copy', 'us/turn', 'bytes/copy')
+    for name in ['shared', 're-parsed']:
+        copies = []
+        start = time.time()
+        for state in states:
+            copy = state.deepCopy()
+            if name == 're-parsed':
+                copy.data.layout = layout.Layout(text)
+            copies.append(copy)
+        elapsed = time.time() - start
+        shared = set()
+        deepSize(initialState, shared)
+        deepSize(states, shared)
+        bytesPerCopy = deepSize(copies, shared) / float(len(copies))
+        print '%-10s %12.1f %12.1f %12.0f' % (name, 1e6 * elapsed / len(states), 1e6 * perTurn * elapsed / len(states), bytesPerCopy)
+
+def benchmarkLayoutLoading(options):
+    """
+    Milliseconds to load every layout of layouts/: parsing the .lay text,
+    through a new LayoutRegistry (from the compiled layouts file, as a fresh
+    batch worker does), and again from the registry of this process.
+    """
+    import os
+    names = sorted([name for name in os.listdir('layouts') if name.endswith('.lay')])
+    for name in names:
+        layout.getLayout(name) # compile every layout
+    timings = []
+    layout.LAYOUT_CACHE.clear()
+    start = time.time()
+    for name in names:
+        f = open(os.path.join('layouts', name))
+        try: layout.Layout([line.strip() for line in f])
+        finally: f.close()
+    timings.append(time.time() - start)
+    layout.LAYOUT_REGISTRIES.clear()
+    start = time.time()
+    for name in names:
+        layout.getLayout(name)
+    timings.append(time.time() - start)
+    start = time.time()
+    for name in names:
+        layout.getLayout(name)
+    timings.append(time.time() - start)
+    print '%-8s %10s %10s %10s' % ('layouts', 'parse', 'compiled', 'indexed')
+    print '%-8d %10.2f %10.2f %10.2f' % tuple([len(names)] + [1000 * seconds for seconds in timings])
+
+def benchmarkVisibility(options):
+    """
+    Microseconds per api.food, api.ghosts and api.capsules call on the
+    recorded states, with full and with partial visibility (which reads
+    the layout's sight lines), and the time to build the sight lines.
+    """
+    import api
+    initialState, states = recordStates(options.layout, options.seed, options.numMoves)
+    board = initialState.data.layout
+    start = time.time()
+    layout.SIGHT_LINES_CACHE.pop(board.layoutText, None)
+    board.getSightLines()
+    build = time.time() - start
+    print 'sight lines of %s built in %.2f ms' % (options.layout, 1000 * build)
+    print '%-10s %10s %10s %10s' % ('visibility', 'food', 'ghosts', 'capsules')
+    partialVisibility = api.partialVisibility
+    try:
+        for partial in [False, True]:
+            api.partialVisibility = partial
+            timings = []
+            for sense in [api.food, api.ghosts, api.capsules]:
+                start = time.time()
+                for state in states:
+                    sense(state)
+                timings.append(1e6 * (time.time() - start) / len(states))
+            print '%-10s %10.1f %10.1f %10.1f' % tuple([['full', 'partial'][partial]] + timings)
+    finally:
+        api.partialVisibility = partialVisibility
+
+def possibleActions(state, agentIndex):
+    "The legal actions of an agent computed from the walls, as the rules did without the action tables."
+    from game import Actions, Directions
+    conf = state.data.agentStates[agentIndex].configuration
+    possible = Actions.getPossibleActions(conf, state.data.layout.walls)
+    if agentIndex == 0: return possible
+    reverse = Actions.reverseDirection(conf.direction)
+    if Directions.STOP in possible: possible.remove(Directions.STOP)
+    if reverse in possible and len(possible) > 1: possible.remove(reverse)
+    return possible
+
+def benchmarkLegalActions(options):
+    """
+    Microseconds per GameState.getLegalActions call, for Pacman and for the
+    ghosts, on every state of a recorded game: through the layout's action
+    tables and computed from the walls. The last column checks both agree.
+    """
+    initialState, states = recordStates(options.layout, options.seed, options.numMoves)
+    start = time.time()
+    initialState.data.layout._actionTables = None
+    initialState.data.layout.getActionTables()
+    print 'action tables of %s built in %.2f ms' % (options.layout, 1000 * (time.time() - start))
+    print '%-8s %10s %10s %8s' % ('agent', 'tables', 'walls', 'same')
+    for name, agents in [('pacman', [0]), ('ghosts', range(1, initialState.getNumAgents()))]:
+        timings = []
+        for legalActions in [lambda state, agentIndex: state.getLegalActions(agentIndex), possibleActions]:
+            start = time.time()
+            for state in states:
+                for agentIndex in agents:
+                    legalActions(state, agentIndex)
+            timings.append(1e6 * (time.time() - start) / (len(states) * len(agents)))
+        same = all([state.getLegalActions(agentIndex) == possibleActions(state, agentIndex) for state in states for agentIndex in agents])
+        print '%-8s %10.2f %10.2f %8s' % (name, timings[0], timings[1], same)
+
+def fullHash(data):
+    "GameStateData's hash before Zobrist hashing: every agent state, the food and the capsules."
+    return int((hash(tuple(data.agentStates)) + 13 * hash(data.food) + 113 * hash(tuple(data.capsules)) + 7 * hash(data.score)) % 1048575)
+
+def benchmarkHashing(options):
+    """
+    Microseconds per hash of a fresh successor (which is what a transposition
+    table or the explored set pays), with the incremental Zobrist hash and
+    recomputing the hash from the whole state, and per comparison of two
+    different states of the same size, on rooms of growing size full of food.
+    """
+    print '%-10s %8s %10s %10s %10s' % ('cells', 'food', 'zobrist', 'full', 'unequal')
+    for size in [10, 30, 50, 90]:
+        board = paddedLayout(0, size)
+        state = pacman.GameState()
+        state.initialize(board, board.getNumGhosts())
+        random.seed(options.seed)
+        successors = []
+        for i in range(options.numMoves):
+            agentIndex = i % state.getNumAgents()
+            if state.isWin() or state.isLose():
+                state = pacman.GameState()
+                state.initialize(board, board.getNumGhosts())
+                agentIndex = 0
+            state = state.generateSuccessor(agentIndex, random.choice(state.getLegalActions(agentIndex)))
+            successors.append(state)
+        timings = []
+        for hashState in [lambda state: hash(state), lambda state: fullHash(state.data)]:
+            copies = [pacman.GameState(successor) for successor in successors]
+            start = time.time()
+            for copy in copies:
+                hashState(copy)
+            timings.append(1e6 * (time.time() - start) / len(copies))
+        start = time.time()
+        for i in range(1, len(successors)):
+            successors[i] == successors[i - 1]
+        timings.append(1e6 * (time.time() - start) / (len(successors) - 1))
+        print '%-10d %8d %10.2f %10.2f %10.2f' % tuple([board.width * board.height, board.food.count()] + timings)
+
+def benchmarkVectorSteps(options):
+    """
+    Game steps (a Pacman move and the ghosts' replies) per second on --layout
+    with uniformly random legal actions: one game with GameState.
+    generateSuccessor, and a VectorEnvironment of growing size, restarting
+    finished games. Each row plays numMoves steps.
+    """
+    import vectorEnvironment
+    board = layout.getLayout(options.layout)
+    random.seed(options.seed)
+    print '%-18s %8s %14s' % ('engine', 'games', 'steps/second')
+    state = None
+    start = time.time()
+    for step in range(options.numMoves):
+        if state == None or state.isWin() or state.isLose():
+            state = pacman.GameState()
+            state.initialize(board, board.getNumGhosts())
+        for agentIndex in range(state.getNumAgents()):
+            if state.isWin() or state.isLose(): break
+            state = state.generateSuccessor(agentIndex, random.choice(state.getLegalActions(agentIndex)))
+    print '%-18s %8d %14.0f' % ('GameState', 1, options.numMoves / (time.time() - start))
+    for numEnvironments in [1, 64, 1024]:
+        environment = vectorEnvironment.VectorEnvironment(board, numEnvironments, seed=options.seed)
+        start = time.time()
+        for step in range(options.numMoves):
+            observation, rewards, done = environment.step(environment.sampleActions(environment.legalActions()))
+            if done.any(): environment.reset(done)
+        print '%-18s %8d %14.0f' % ('VectorEnvironment', numEnvironments, numEnvironments * options.numMoves / (time.time() - start))
+
+def benchmarkEnvironment(options):
+    """
+    Steps (a Pacman move and the ghosts' replies) per second of a
+    PacmanEnvironment on --layout with uniformly random legal actions, with
+    the GameState as observation and with the ObservationEncoder arrays.
+    Each row plays 10 * numMoves steps.
+    """
+    import pacmanEnvironment
+    print '%-12s %14s' % ('observation', 'steps/second')
+    for name, encoder in [('GameState', None), ('array', pacmanEnvironment.ObservationEncoder())]:
+        environment = pacmanEnvironment.PacmanEnvironment(options.layout, encoder=encoder)
+        environment.reset(seed=options.seed)
+        start = time.time()
+        for step in range(10 * options.numMoves):
+            observation, reward, done, info = environment.step(random.choice(environment.legalActions()))
+            if done: environment.reset()
+        print '%-12s %14.0f' % (name, 10 * options.numMoves / (time.time() - start))
+
+def timeCalls(callOnce, numCalls):
+    "Returns the mean wall time in microseconds of callOnce()."
+    start = time.time()
+    for i in range(numCalls):
+        callOnce()
+    return 1e6 * (time.time() - start) / numCalls
+
+def benchmarkTimeBudgets(options):
+    """
+    The overhead per move of timing an agent under --catchExceptions: the
+    SIGALRM-based util.TimeoutFunction (alone, and built and timed with
+    time.time as Game.run used to per move) against a util.TimeBudget
+    move, in the main thread and in a worker thread (where signals cannot
+    be used), and the cost of one util.timeRemaining() poll. Each row
+    times 1000 * numMoves calls of a function that returns at once.
+    """
+    import threading
+    numCalls = 1000 * options.numMoves
+    act = lambda: None
+    timed = util.TimeoutFunction(act, 1)
+    budget = util.TimeBudget(1.0, 1e9)
+    def budgetMove():
+        budget.startMove()
+        budget.call(act)
+        budget.endMove()
+    def signalMove():
+        start = time.time()
+        util.TimeoutFunction(act, 1)()
+        return time.time() - start
+    rows = [('TimeoutFunction', timeCalls(timed, numCalls)), ('signal move', timeCalls(signalMove, numCalls)),
+            ('TimeBudget', timeCalls(budgetMove, numCalls))]
+    results = []
+    worker = threading.Thread(target=lambda: results.append(timeCalls(budgetMove, numCalls)))
+    worker.start()
+    worker.join()
+    rows.append(('TimeBudget (thread)', results[0]))
+    budget.startMove()
+    rows.append(('timeRemaining poll', budget.call(timeCalls, util.timeRemaining, numCalls)))
+    budget.endMove()
+    print '%-22s %16s' % ('timing', 'us/call')
+    for name, micros in rows:
+        print '%-22s %16.2f' % (name, micros)
+
+BENCHMARKS = {
+    'backups': benchmarkBackups,
+    'environment': benchmarkEnvironment,
+    'foodCount': benchmarkFoodCount,
+    'grids': benchmarkGrids,
+    'hashing': benchmarkHashing,
+    'horizon': benchmarkHorizon,
+    'layoutCopies': benchmarkLayoutCopies,
+    'legalActions': benchmarkLegalActions,
+    'layoutLoading': benchmarkLayoutLoading,
+    'policies': benchmarkPolicies,
+    'stopping': benchmarkStopping,
+    'successors': benchmarkSuccessors,
+    'timeBudgets': benchmarkTimeBudgets,
+    'turns': benchmarkTurns,
+    'updateModes': benchmarkUpdateModes,
+    'vectorSteps': benchmarkVectorSteps,
+    'visibility': benchmarkVisibility,
+    'wallScaling': benchmarkWallScaling,
+    'warmStart': benchmarkWarmStart,
+}
+
+def readCommand(argv):
+    from optparse import OptionParser
+    parser = OptionParser('USAGE: python benchmarks.py --benchmark NAME <options>')
+    parser.add_option('-b', '--benchmark', dest='benchmark',
+                      help='one of: ' + ', '.join(sorted(BENCHMARKS.keys())), default='updateModes')
+    parser.add_option('-l', '--layout', dest='layout',
+                      help='the layout to benchmark on [Default: %default]', default='mediumClassic')
+    parser.add_option('-m', '--numMoves', dest='numMoves', type='int',
+                      help='the number of recorded moves to replay [Default: %default]', default=50)
+    parser.add_option('-s', '--seed', dest='seed', type='int',
+                      help='the random seed of the recorded game [Default: %default]', default=0)
+    parser.add_option('-v', '--verbose', action='store_true', dest='verbose',
+                      help='also print per-move details', default=False)
+    options, otherjunk = parser.parse_args(argv)
+    if len(otherjunk) != 0:
+        raise Exception('Command line input not understood: ' + str(otherjunk))
+    if options.benchmark not in BENCHMARKS:
+        raise Exception('Unknown benchmark: ' + options.benchmark)
+    return options
+
+if __name__ == '__main__':
+    options = readCommand(sys.argv[1:])
+    BENCHMARKS[options.benchmark](options)
@@ -22,9 +22,14 @@
 
 from util import *
 import time, os
+import hashlib
 import traceback
 import sys
 
+# When True, every change of the food or capsules recounts them and checks
+# the counters GameStateData keeps (see GameStateData.checkCounts)
+CHECK_COUNTS = False
+
 #######################
 # Parts worth reading #
 #######################
@@ -183,6 +188,10 @@ class Grid:
     def __setitem__(self, key, item):
         self.data[key] = item
 
+    def get(self, x, y):
+        "grid[x][y], for an (x,y) on the grid."
+        return self.data[x][y]
+
     def __str__(self):
         out = [[str(self.data[x][y])[0] for x in range(self.width)] for y in range(self.height)]
         out.reverse()
@@ -190,6 +199,7 @@ class Grid:
 
     def __eq__(self, other):
         if other == None: return False
+        if isinstance(other, BitGrid): return other == self
         return self.data == other.data
 
     def __hash__(self):
@@ -204,16 +214,29 @@ class Grid:
         return hash(h)
 
     def copy(self):
-        g = Grid(self.width, self.height)
-        g.data = [x[:] for x in self.data]
-        return g
+        return self._withData([x[:] for x in self.data])
 
     def deepCopy(self):
         return self.copy()
 
     def shallowCopy(self):
-        g = Grid(self.width, self.height)
-        g.data = self.data
+        return self._withData(self.data)
+
+    def copyWithValue(self, x, y, item):
+        """
+        Returns a copy with grid[x][y] set to item. Only column x is copied;
+        every other column is shared with this grid.
+        """
+        data = self.data[:]
+        data[x] = data[x][:]
+        data[x][y] = item
+        return self._withData(data)
+
+    def _withData(self, data):
+        "A grid of the same size backed by data, without building an empty one first."
+        g = Grid(0, 0)
+        g.width, g.height = self.width, self.height
+        g.data = data
         return g
 
     def count(self, item =True ):
@@ -274,6 +297,175 @@ class Grid:
                 bools.append(False)
         return bools
 
+class BitGrid(Grid):
+    """
+    A boolean Grid backed by a single integer bitboard: cell (x,y) is bit
+    x * height + y.  Data is accessed via grid[x][y] like a Grid.
+
+    Integers are immutable, so a copy shares the bitboard and costs O(1).
+    count() is a popcount, the hash is the hash of the bits (the same value
+    Grid.__hash__ computes), and asList() only visits the set bits.
+
+    A single cell is cheapest to read with get(x, y), a bit test. The
+    columns grid[x] returns are built once per grid: views of the bits or,
+    when the grid is frozen (see freeze), unpacked tuples, so reading the
+    walls as walls[x][y] or walls.get(x, y) costs what it does on a Grid. A frozen grid refuses
+    writes; its copies are not frozen.
+    """
+    def __init__(self, width, height, initialValue=False, bitRepresentation=None):
+        if initialValue not in [False, True]: raise Exception('Grids can only contain booleans')
+        self.CELLS_PER_INT = 30
+
+        self.width = width
+        self.height = height
+        self.frozen = False
+        self.columns = None
+        self.bits = 0
+        if initialValue:
+            self.bits = (1 << (width * height)) - 1
+        if bitRepresentation:
+            self._unpackBits(bitRepresentation)
+
+    def __getitem__(self, i):
+        columns = self.columns
+        if columns == None:
+            columns = self.columns = self._columns()
+        return columns[i]
+
+    def _columns(self):
+        if self.frozen:
+            return [FrozenBitGridColumn([(self.bits >> (x * self.height + y)) & 1 == 1 for y in range(self.height)]) for x in range(self.width)]
+        return [BitGridColumn(self, x) for x in range(self.width)]
+
+    def __getstate__(self):
+        "Pickles the bits, not the columns built from them."
+        state = self.__dict__.copy()
+        state['columns'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.frozen: self.columns = self._columns()
+
+    def get(self, x, y):
+        "grid[x][y], for an (x,y) on the grid, read from the bits without a column unless frozen."
+        if self.frozen: return self.columns[x][y]
+        return (self.bits >> (x * self.height + y)) & 1 == 1
+
+    def __setitem__(self, key, item):
+        column = self[key]
+        for y in range(self.height):
+            column[y] = item[y]
+
+    def __str__(self):
+        out = [[str(self[x][y])[0] for x in range(self.width)] for y in range(self.height)]
+        out.reverse()
+        return '\n'.join([''.join(x) for x in out])
+
+    def __eq__(self, other):
+        if other == None: return False
+        if not isinstance(other, BitGrid):
+            return self.asList() == other.asList()
+        return self.bits == other.bits and self.width == other.width and self.height == other.height
+
+    def __hash__(self):
+        return hash(self.bits)
+
+    def copy(self):
+        return self._withBits(self.bits)
+
+    def deepCopy(self):
+        return self.copy()
+
+    def shallowCopy(self):
+        return self._withBits(self.bits)
+
+    def copyWithValue(self, x, y, item):
+        """
+        Returns a copy with grid[x][y] set to item.
+        """
+        if not (0 <= x < self.width and 0 <= y < self.height): raise IndexError('grid index out of range')
+        if item not in [False, True]: raise Exception('Grids can only contain booleans')
+        bit = 1 << (x * self.height + y)
+        if item:
+            return self._withBits(self.bits | bit)
+        return self._withBits(self.bits & ~bit)
+
+    def freeze(self):
+        "Makes the grid read-only, e.g. because it belongs to a shared Layout."
+        self.frozen = True
+        self.columns = self._columns()
+        return self
+
+    def _withBits(self, bits):
+        "A grid of the same size backed by bits."
+        g = BitGrid(0, 0)
+        g.width, g.height = self.width, self.height
+        g.bits = bits
+        return g
+
+    def count(self, item =True ):
+        ones = bin(self.bits).count('1')
+        if item == True: return ones
+        if item == False: return self.width * self.height - ones
+        return 0
+
+    def asList(self, key = True):
+        if key == True:
+            bits = self.bits
+        elif key == False:
+            bits = ~self.bits & ((1 << (self.width * self.height)) - 1)
+        else:
+            return []
+        list = []
+        height = self.height
+        while bits:
+            lowest = bits & -bits
+            index = lowest.bit_length() - 1
+            list.append( (index / height, index % height) )
+            bits ^= lowest
+        return list
+
+class BitGridColumn(object):
+    """
+    Column x of a BitGrid, so that grid[x][y] reads and writes a single bit.
+    """
+    __slots__ = ('grid', 'x')
+
+    def __init__(self, grid, x):
+        self.grid = grid
+        self.x = x
+
+    def __len__(self):
+        return self.grid.height
+
+    def __getitem__(self, y):
+        grid = self.grid
+        if y < 0: y += grid.height
+        if not 0 <= y < grid.height: raise IndexError('grid index out of range')
+        return (grid.bits >> (self.x * grid.height + y)) & 1 == 1
+
+    def __setitem__(self, y, item):
+        grid = self.grid
+        if grid.frozen: raise Exception('This grid is read-only; modify a copy of it')
+        if y < 0: y += grid.height
+        if not 0 <= y < grid.height: raise IndexError('grid index out of range')
+        if item not in [False, True]: raise Exception('Grids can only contain booleans')
+        bit = 1 << (self.x * grid.height + y)
+        if item:
+            grid.bits |= bit
+        else:
+            grid.bits &= ~bit
+
+class FrozenBitGridColumn(tuple):
+    """
+    Column x of a frozen BitGrid, unpacked into a tuple of booleans.
+    """
+    __slots__ = ()
+
+    def __setitem__(self, y, item):
+        raise Exception('This grid is read-only; modify a copy of it')
+
 def reconstituteGrid(bitRep):
     if type(bitRep) is not type((1,2)):
         return bitRep
@@ -342,7 +534,7 @@ class Actions:
             dx, dy = vec
             next_y = y_int + dy
             next_x = x_int + dx
-            if not walls[next_x][next_y]: possible.append(dir)
+            if not walls.get(next_x, next_y): possible.append(dir)
 
         return possible
 
@@ -358,7 +550,7 @@ class Actions:
             if next_x < 0 or next_x == walls.width: continue
             next_y = y_int + dy
             if next_y < 0 or next_y == walls.height: continue
-            if not walls[next_x][next_y]: neighbors.append((next_x, next_y))
+            if not walls.get(next_x, next_y): neighbors.append((next_x, next_y))
         return neighbors
     getLegalNeighbors = staticmethod(getLegalNeighbors)
 
@@ -368,21 +560,62 @@ class Actions:
         return (x + dx, y + dy)
     getSuccessor = staticmethod(getSuccessor)
 
+# Zobrist keys: a 64-bit key for every food cell, capsule cell, agent
+# configuration and scared timer, taken from a SHA-1 digest of the item, so
+# that every process and every run hashes a state the same way
+ZOBRIST_KEYS = {}
+
+def zobristItem( item ):
+    "Equal items get equal reprs: (1, 2) and (1.0, 2.0) are the same position."
+    if isinstance( item, tuple ):
+        return tuple( [ zobristItem( part ) for part in item ] )
+    if isinstance( item, float ) and item == int( item ):
+        return int( item )
+    return item
+
+def zobristKey( item ):
+    key = ZOBRIST_KEYS.get( item )
+    if key == None:
+        digest = hashlib.sha1( repr( zobristItem( item ) ) ).hexdigest()
+        key = ZOBRIST_KEYS[item] = int( digest[:16], 16 )
+    return key
+
+def agentZobristKey( agentIndex, agentState ):
+    "The part of the Zobrist hash of agent agentIndex: its configuration and scared timer."
+    configuration = agentState.configuration
+    if configuration == None:
+        key = zobristKey( ( 'agent', agentIndex, None ) )
+    else:
+        key = zobristKey( ( 'agent', agentIndex, configuration.pos, configuration.direction ) )
+    return key ^ zobristKey( ( 'scared', agentIndex, agentState.scaredTimer ) )
+
 class GameStateData:
     """
-
+    The data of a game state. It carries an incremental Zobrist hash: the XOR
+    of the keys of the remaining food and capsules and of every agent's
+    configuration and scared timer. eatFood and eatCapsule XOR out what they
+    remove; ownAgentState XORs out an agent about to change, and
+    zobristHash() XORs its new key back in.
     """
     def __init__( self, prevState = None ):
         """
         Generates a new data packet by copying information from its predecessor.
         """
         if prevState != None:
-            self.food = prevState.food.shallowCopy()
-            self.capsules = prevState.capsules[:]
-            self.agentStates = self.copyAgentStates( prevState.agentStates )
+            # Copy-on-write: the food grid, the capsule list and every agent
+            # state are shared with the predecessor until a rule changes them
+            # (see ownAgentState, eatFood and eatCapsule)
+            self.food = prevState.food
+            self.capsules = prevState.capsules
+            self.numFood = prevState.numFood
+            self.numCapsules = prevState.numCapsules
+            self.agentStates = prevState.agentStates[:]
+            self._ownedAgents = [False for agentState in self.agentStates]
             self.layout = prevState.layout
             self._eaten = prevState._eaten
             self.score = prevState.score
+            self._zobrist = prevState.zobristHash()
+            self._changedAgents = []
 
         self._foodEaten = None
         self._foodAdded = None
@@ -395,7 +628,25 @@ class GameStateData:
     def deepCopy( self ):
         state = GameStateData( self )
         state.food = self.food.deepCopy()
-        state.layout = self.layout.deepCopy()
+        state.capsules = self.capsules[:]
+        state.numFood = self.numFood
+        state.numCapsules = self.numCapsules
+        state.agentStates = self.copyAgentStates( self.agentStates )
+        state._ownedAgents = [True for agentState in state.agentStates]
+        state.layout = self.layout # layouts are immutable and shared
+        state._agentMoved = self._agentMoved
+        state._foodEaten = self._foodEaten
+        state._foodAdded = self._foodAdded
+        state._capsuleEaten = self._capsuleEaten
+        return state
+
+    def copyOnWrite( self ):
+        """
+        A copy that shares the food grid, the capsule list and every agent
+        state with this one until they are changed through ownAgentState,
+        eatFood or eatCapsule, so that changing it leaves this state intact.
+        """
+        state = GameStateData( self )
         state._agentMoved = self._agentMoved
         state._foodEaten = self._foodEaten
         state._foodAdded = self._foodAdded
@@ -408,12 +659,73 @@ class GameStateData:
             copiedStates.append( agentState.copy() )
         return copiedStates
 
+    def ownAgentState( self, agentIndex ):
+        """
+        Returns the AgentState of agentIndex for editing, copying it first if
+        it is still shared with the predecessor.
+        """
+        if not self._ownedAgents[agentIndex]:
+            self.agentStates[agentIndex] = self.agentStates[agentIndex].copy()
+            self._ownedAgents[agentIndex] = True
+        if agentIndex not in self._changedAgents:
+            self._zobrist ^= agentZobristKey( agentIndex, self.agentStates[agentIndex] )
+            self._changedAgents.append( agentIndex )
+        return self.agentStates[agentIndex]
+
+    def eatFood( self, x, y ):
+        "Removes the food at (x,y) without changing the predecessor's grid."
+        if not self.food.get( x, y ): return
+        self.food = self.food.copyWithValue( x, y, False )
+        self.numFood -= 1
+        self._zobrist ^= zobristKey( ( 'food', x, y ) )
+        if CHECK_COUNTS: self.checkCounts()
+
+    def eatCapsule( self, position ):
+        "Removes the capsule at position without changing the predecessor's list."
+        if position in self.capsules:
+            self._zobrist ^= zobristKey( ( 'capsule', ) + tuple( position ) )
+        self.capsules = [capsule for capsule in self.capsules if capsule != position]
+        self.numCapsules = len( self.capsules )
+        if CHECK_COUNTS: self.checkCounts()
+
+    def checkCounts( self ):
+        """
+        Recounts the food and the capsules and raises an exception if the
+        counters kept by eatFood and eatCapsule disagree, e.g. because the
+        food grid was edited in place.
+        """
+        if self.numFood != self.food.count():
+            raise Exception( 'Food counter is %d but the grid holds %d' % ( self.numFood, self.food.count() ) )
+        if self.numCapsules != len( self.capsules ):
+            raise Exception( 'Capsule counter is %d but there are %d capsules' % ( self.numCapsules, len( self.capsules ) ) )
+        if self.zobristHash() != self.computeZobristHash():
+            raise Exception( 'The incremental Zobrist hash does not match the state' )
+
+    def zobristHash( self ):
+        "The 64-bit Zobrist hash of the state (the score aside)."
+        for agentIndex in self._changedAgents:
+            self._zobrist ^= agentZobristKey( agentIndex, self.agentStates[agentIndex] )
+        self._changedAgents = []
+        return self._zobrist
+
+    def computeZobristHash( self ):
+        "The Zobrist hash computed from scratch."
+        key = 0
+        for x, y in self.food.asList():
+            key ^= zobristKey( ( 'food', x, y ) )
+        for position in self.capsules:
+            key ^= zobristKey( ( 'capsule', ) + tuple( position ) )
+        for agentIndex, agentState in enumerate( self.agentStates ):
+            key ^= agentZobristKey( agentIndex, agentState )
+        return key
+
     def __eq__( self, other ):
         """
         Allows two states to be compared.
         """
         if other == None: return False
         # TODO Check for type of other
+        if self.zobristHash() != other.zobristHash(): return False
         if not self.agentStates == other.agentStates: return False
         if not self.food == other.food: return False
         if not self.capsules == other.capsules: return False
@@ -424,13 +736,7 @@ class GameStateData:
         """
         Allows states to be keys of dictionaries.
         """
-        for i, state in enumerate( self.agentStates ):
-            try:
-                int(hash(state))
-            except TypeError, e:
-                print e
-                #hash(state)
-        return int((hash(tuple(self.agentStates)) + 13*hash(self.food) + 113* hash(tuple(self.capsules)) + 7 * hash(self.score)) % 1048575 )
+        return hash( ( self.zobristHash(), self.score ) )
 
     def __str__( self ):
         width, height = self.layout.width, self.layout.height
@@ -490,7 +796,9 @@ class GameStateData:
         """
         self.food = layout.food.copy()
         #self.capsules = []
-        self.capsules = layout.capsules[:]
+        self.capsules = list( layout.capsules )
+        self.numFood = self.food.count()
+        self.numCapsules = len( self.capsules )
         self.layout = layout
         self.score = 0
         self.scoreChange = 0
@@ -502,7 +810,10 @@ class GameStateData:
                 if numGhosts == numGhostAgents: continue # Max ghosts reached already
                 else: numGhosts += 1
             self.agentStates.append( AgentState( Configuration( pos, Directions.STOP), isPacman) )
+        self._ownedAgents = [True for a in self.agentStates]
         self._eaten = [False for a in self.agentStates]
+        self._changedAgents = []
+        self._zobrist = self.computeZobristHash()
 
 try:
     import boinc
@@ -515,7 +826,7 @@ class Game:
     The Game manages the control flow, soliciting actions from agents.
     """
 
-    def __init__( self, agents, display, rules, startingIndex=0, muteAgents=False, catchExceptions=False ):
+    def __init__( self, agents, display, rules, startingIndex=0, muteAgents=False, catchExceptions=False, fastMode=False ):
         self.agentCrashed = False
         self.agents = agents
         self.display = display
@@ -524,10 +835,13 @@ class Game:
         self.gameOver = False
         self.muteAgents = muteAgents
         self.catchExceptions = catchExceptions
+        self.fastMode = fastMode
         self.moveHistory = []
         self.totalAgentTimes = [0 for agent in agents]
         self.totalAgentTimeWarnings = [0 for agent in agents]
         self.agentTimeout = False
+        # the clocks of the agents under catchExceptions, charged with every move and the startup
+        self.timeBudgets = [TimeBudget(rules.getMoveTimeout(i), rules.getMaxTotalTime(i)) for i in range(len(agents))]
         import cStringIO
         self.agentOutput = [cStringIO.StringIO() for agent in agents]
 
@@ -537,6 +851,13 @@ class Game:
         else:
             return self.rules.getProgress(self)
 
+    def checkUnchanged( self, agentIndex ):
+        "Raises an exception if agent agentIndex edited the game's state in place (see runFast)."
+        try:
+            self.state.data.checkCounts()
+        except Exception, data:
+            raise Exception( 'Agent %d changed the state it was handed: %s' % ( agentIndex, data ) )
+
     def _agentCrash( self, agentIndex, quiet=False):
         "Helper method for handling agent crashes"
         if not quiet: traceback.print_exc()
@@ -568,6 +889,8 @@ class Game:
         """
         Main control loop for game play.
         """
+        if self.fastMode and not self.catchExceptions:
+            return self.runFast()
         self.display.initialize(self.state.data)
         self.numMoves = 0
 
@@ -587,12 +910,12 @@ class Game:
                 self.mute(i)
                 if self.catchExceptions:
                     try:
-                        timed_func = TimeoutFunction(agent.registerInitialState, int(self.rules.getMaxStartupTime(i)))
+                        budget = self.timeBudgets[i]
+                        budget.startMove(self.rules.getMaxStartupTime(i))
                         try:
-                            start_time = time.time()
-                            timed_func(self.state.deepCopy())
-                            time_taken = time.time() - start_time
-                            self.totalAgentTimes[i] += time_taken
+                            budget.call(agent.registerInitialState, self.state.deepCopy())
+                            budget.endMove()
+                            self.totalAgentTimes[i] = budget.used
                         except TimeoutFunctionException:
                             print >>sys.stderr, "Agent %d ran out of time on startup!" % i
                             self.unmute()
@@ -616,18 +939,19 @@ class Game:
             agent = self.agents[agentIndex]
             move_time = 0
             skip_action = False
+            if self.catchExceptions:
+                # the observation and the action share the move's time
+                budget = self.timeBudgets[agentIndex]
+                budget.startMove()
             # Generate an observation of the state
             if 'observationFunction' in dir( agent ):
                 self.mute(agentIndex)
                 if self.catchExceptions:
                     try:
-                        timed_func = TimeoutFunction(agent.observationFunction, int(self.rules.getMoveTimeout(agentIndex)))
                         try:
-                            start_time = time.time()
-                            observation = timed_func(self.state.deepCopy())
+                            observation = budget.call(agent.observationFunction, self.state.deepCopy())
                         except TimeoutFunctionException:
                             skip_action = True
-                        move_time += time.time() - start_time
                         self.unmute()
                     except Exception,data:
                         self._agentCrash(agentIndex, quiet=False)
@@ -644,20 +968,22 @@ class Game:
             self.mute(agentIndex)
             if self.catchExceptions:
                 try:
-                    timed_func = TimeoutFunction(agent.getAction, int(self.rules.getMoveTimeout(agentIndex)) - int(move_time))
                     try:
-                        start_time = time.time()
                         if skip_action:
                             raise TimeoutFunctionException()
-                        action = timed_func( observation )
+                        action = budget.call(agent.getAction, observation)
                     except TimeoutFunctionException:
-                        print >>sys.stderr, "Agent %d timed out on a single move!" % agentIndex
+                        budget.endMove()
+                        if budget.exhausted():
+                            print >>sys.stderr, "Agent %d ran out of time! (time: %1.2f)" % (agentIndex, budget.used)
+                        else:
+                            print >>sys.stderr, "Agent %d timed out on a single move!" % agentIndex
                         self.agentTimeout = True
                         self._agentCrash(agentIndex, quiet=True)
                         self.unmute()
                         return
 
-                    move_time += time.time() - start_time
+                    move_time = budget.endMove()
 
                     if move_time > self.rules.getMoveWarningTime(agentIndex):
                         self.totalAgentTimeWarnings[agentIndex] += 1
@@ -669,7 +995,7 @@ class Game:
                             self.unmute()
                             return
 
-                    self.totalAgentTimes[agentIndex] += move_time
+                    self.totalAgentTimes[agentIndex] = budget.used
                     #print "Agent: %d, time: %f, total: %f" % (agentIndex, move_time, self.totalAgentTimes[agentIndex])
                     if self.totalAgentTimes[agentIndex] > self.rules.getMaxTotalTime(agentIndex):
                         print >>sys.stderr, "Agent %d ran out of time! (time: %1.2f)" % (agentIndex, self.totalAgentTimes[agentIndex])
@@ -727,3 +1053,56 @@ class Game:
                     self.unmute()
                     return
         self.display.finish()
+
+    def runFast( self ):
+        """
+        Control loop for trusted, in-process agents (see fastMode). Agents are
+        handed a copy-on-write view of the game's state instead of a deep copy
+        (see GameStateData.copyOnWrite): successors the agents generate leave
+        the game's state intact, but agents must not edit the food grid or an
+        agent state in place. With CHECK_COUNTS, the state is rehashed after
+        every call to catch agents that do. The agents' hooks are looked up
+        once, output is not muted and nothing is timed; exceptions propagate
+        to the caller.
+        """
+        self.display.initialize(self.state.data)
+        self.numMoves = 0
+
+        for agent in self.agents:
+            if not agent: raise Exception('An agent failed to load')
+        for agentIndex, agent in enumerate(self.agents):
+            if hasattr(agent, 'registerInitialState'):
+                agent.registerInitialState(self.state.copyOnWrite())
+                if CHECK_COUNTS: self.checkUnchanged(agentIndex)
+
+        getActions = [agent.getAction for agent in self.agents]
+        observers = [getattr(agent, 'observationFunction', None) for agent in self.agents]
+        agentIndex = self.startingIndex
+        numAgents = len( self.agents )
+
+        while not self.gameOver:
+            # Generate an observation of the state and solicit an action
+            if observers[agentIndex] != None:
+                observation = observers[agentIndex](self.state.copyOnWrite())
+            else:
+                observation = self.state.copyOnWrite()
+            action = getActions[agentIndex](observation)
+            if CHECK_COUNTS: self.checkUnchanged(agentIndex)
+
+            # Execute the action
+            self.moveHistory.append( (agentIndex, action) )
+            self.state = self.state.generateSuccessor( agentIndex, action )
+
+            # Change the display
+            self.display.update( self.state.data )
+
+            # Allow for game specific conditions (winning, losing, etc.)
+            self.rules.process(self.state, self)
+            # Next agent
+            agentIndex = ( agentIndex + 1 ) % numAgents
+
+        # inform a learning agent of the game result
+        for agent in self.agents:
+            if hasattr(agent, 'final'):
+                agent.final( self.state )
+        self.display.finish()
@@ -14,27 +14,48 @@
 
 from util import manhattanDistance
 from game import Grid
+from game import BitGrid
+import marshal
 import os
 import random
 
 VISIBILITY_MATRIX_CACHE = {}
+# the sight lines of every layout text seen so far (see Layout.getSightLines)
+SIGHT_LINES_CACHE = {}
+# the shared Layout of every layout text loaded so far (see internLayout)
+LAYOUT_CACHE = {}
+# the LayoutRegistry of every layouts directory searched so far, by absolute path
+LAYOUT_REGISTRIES = {}
+# the compiled layouts of a directory are kept in this file of the directory
+COMPILED_LAYOUTS_FILE = '.layoutIndex'
 
 class Layout:
     """
     A Layout manages the static information about the game board.
+
+    Layouts are immutable once parsed: the walls and food grids are frozen
+    and the capsules and agent positions are tuples, so every game state can
+    share one Layout instead of copying it.
     """
 
-    def __init__(self, layoutText):
+    def __init__(self, layoutText, compiled=None):
         self.width = len(layoutText[0])
         self.height= len(layoutText)
-        self.walls = Grid(self.width, self.height, False)
-        self.food = Grid(self.width, self.height, False)
+        self.walls = BitGrid(self.width, self.height, False)
+        self.food = BitGrid(self.width, self.height, False)
         self.capsules = []
         self.agentPositions = []
         self.numGhosts = 0
-        self.processLayoutText(layoutText)
-        self.layoutText = layoutText
+        if compiled == None:
+            self.processLayoutText(layoutText)
+        else:
+            self.walls.bits, self.food.bits, self.capsules, self.agentPositions, self.numGhosts = compiled
+        self.layoutText = tuple(layoutText)
         self.totalFood = len(self.food.asList())
+        self.walls.freeze()
+        self.food.freeze()
+        self.capsules = tuple(self.capsules)
+        self.agentPositions = tuple(self.agentPositions)
         # self.initializeVisibilityMatrix()
 
     def getNumGhosts(self):
@@ -61,9 +82,62 @@ class Layout:
         else:
             self.visibility = VISIBILITY_MATRIX_CACHE[reduce(str.__add__, self.layoutText)]
 
+    def getActionTables(self):
+        """
+        The legal actions of every floor cell, built the first time they are
+        needed: (actions, ghostActions). actions[(x,y)] lists the directions
+        (STOP included) of an agent standing on (x,y), in the order of
+        Actions.getPossibleActions; ghostActions[((x,y), heading)] lists those
+        of a ghost arriving there with that heading, without STOP and without
+        turning around unless it is a dead end. Only whole cells are listed.
+        """
+        if getattr(self, '_actionTables', None) == None:
+            from game import Actions, Configuration, Directions
+            actions = {}
+            ghostActions = {}
+            for x in range(self.width):
+                for y in range(self.height):
+                    if self.walls[x][y]: continue
+                    possible = Actions.getPossibleActions(Configuration((x, y), Directions.STOP), self.walls)
+                    actions[(x, y)] = possible
+                    for heading in [Directions.NORTH, Directions.SOUTH, Directions.EAST, Directions.WEST, Directions.STOP]:
+                        legal = [action for action in possible if action != Directions.STOP]
+                        reverse = Actions.reverseDirection(heading)
+                        if reverse in legal and len(legal) > 1:
+                            legal.remove(reverse)
+                        ghostActions[((x, y), heading)] = legal
+            self._actionTables = (actions, ghostActions)
+        return self._actionTables
+
+    def getSightLines(self):
+        """
+        For every floor cell (x,y), the cells seen from it along each of the
+        four directions, nearest first, up to the first wall:
+        sightLines[(x,y)][direction] is a tuple of (x,y) pairs. Built once
+        per layout text; api.visible slices these to its distance limits.
+        """
+        if self.layoutText not in SIGHT_LINES_CACHE:
+            from game import Directions
+            vectors = {Directions.NORTH: (0, 1), Directions.SOUTH: (0, -1), Directions.EAST: (1, 0), Directions.WEST: (-1, 0)}
+            sightLines = {}
+            for x in range(self.width):
+                for y in range(self.height):
+                    if self.walls[x][y]: continue
+                    lines = {}
+                    for direction, (dx, dy) in vectors.items():
+                        line = []
+                        nextx, nexty = x + dx, y + dy
+                        while 0 <= nextx < self.width and 0 <= nexty < self.height and not self.walls[nextx][nexty]:
+                            line.append((nextx, nexty))
+                            nextx, nexty = nextx + dx, nexty + dy
+                        lines[direction] = tuple(line)
+                    sightLines[(x, y)] = lines
+            SIGHT_LINES_CACHE[self.layoutText] = sightLines
+        return SIGHT_LINES_CACHE[self.layoutText]
+
     def isWall(self, pos):
         x, col = pos
-        return self.walls[x][col]
+        return self.walls.get(x, col)
 
     def getRandomLegalPosition(self):
         x = random.choice(range(self.width))
@@ -90,7 +164,16 @@ class Layout:
         return "\n".join(self.layoutText)
 
     def deepCopy(self):
-        return Layout(self.layoutText[:])
+        # Layouts are immutable, so a copy can be the layout itself
+        return self
+
+    def compile(self):
+        """
+        The parsed board as plain values (the walls and food bitboards, the
+        capsules, the agent starts and the number of ghosts), which
+        Layout(layoutText, compiled) rebuilds without parsing the text.
+        """
+        return (self.walls.bits, self.food.bits, self.capsules, self.agentPositions, self.numGhosts)
 
     def processLayoutText(self, layoutText):
         """
@@ -129,21 +212,108 @@ class Layout:
             self.agentPositions.append( (int(layoutChar), (x,y)))
             self.numGhosts += 1
 def getLayout(name, back = 2):
-    if name.endswith('.lay'):
-        layout = tryToLoad('layouts/' + name)
-        if layout == None: layout = tryToLoad(name)
-    else:
-        layout = tryToLoad('layouts/' + name + '.lay')
-        if layout == None: layout = tryToLoad(name + '.lay')
-    if layout == None and back >= 0:
-        curdir = os.path.abspath('.')
-        os.chdir('..')
-        layout = getLayout(name, back -1)
-        os.chdir(curdir)
-    return layout
+    """
+    Finds the layout name (with or without .lay) in layouts/ or next to the
+    current directory, then in up to back + 1 parent directories. Layouts
+    found in a layouts/ directory are loaded through its LayoutRegistry.
+    The current directory is never changed.
+    """
+    if not name.endswith('.lay'): name += '.lay'
+    for level in range(back + 2):
+        base = os.path.join(*(['.'] + ['..'] * level))
+        layout = getRegistry(os.path.join(base, 'layouts')).get(name)
+        if layout == None: layout = tryToLoad(os.path.join(base, name))
+        if layout != None: return layout
+    return None
+
+def getRegistry(directory):
+    "The LayoutRegistry of directory, created the first time it is searched."
+    directory = os.path.abspath(directory)
+    if directory not in LAYOUT_REGISTRIES:
+        LAYOUT_REGISTRIES[directory] = LayoutRegistry(directory)
+    return LAYOUT_REGISTRIES[directory]
+
+class LayoutRegistry:
+    """
+    The .lay files of one directory, listed once, and their compiled form.
+
+    A compiled layout stores the layout text together with its parsed walls
+    and food bitboards, capsules and agent starts; the compiled layouts of
+    the directory are kept in one marshal file (COMPILED_LAYOUTS_FILE), so a
+    layout is parsed only the first time it is loaded. Each entry records
+    the mtime and size of its .lay file and is recompiled when they change.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        self.index = {}
+        if os.path.isdir(directory):
+            for fileName in os.listdir(directory):
+                if fileName.endswith('.lay'):
+                    self.index[fileName] = os.path.join(directory, fileName)
+        self.layouts = {}
+        self.compiled = None
+
+    def get(self, name):
+        "The Layout of the file name (e.g. mediumClassic.lay), or None if it is not listed."
+        if name not in self.index: return None
+        if name not in self.layouts:
+            self.layouts[name] = self.load(name)
+        return self.layouts[name]
+
+    def load(self, name):
+        path = self.index[name]
+        try:
+            info = os.stat(path)
+        except OSError:
+            return None
+        if self.compiled == None:
+            self.compiled = self.readCompiled()
+        entry = self.compiled.get(name)
+        if entry == None or entry[0] != info.st_mtime or entry[1] != info.st_size:
+            layout = tryToLoad(path)
+            if layout == None: return None
+            self.compiled[name] = (info.st_mtime, info.st_size, layout.layoutText, layout.compile())
+            self.writeCompiled()
+            return layout
+        return internLayout(entry[2], entry[3])
+
+    def readCompiled(self):
+        path = os.path.join(self.directory, COMPILED_LAYOUTS_FILE)
+        if not os.path.exists(path): return {}
+        try:
+            f = open(path, 'rb')
+            try: compiled = marshal.load(f)
+            finally: f.close()
+        except (IOError, EOFError, ValueError, TypeError):
+            return {}
+        if type(compiled) != dict: return {}
+        return compiled
+
+    def writeCompiled(self):
+        # Written to a temporary file first, so that a concurrent reader never
+        # sees half a file; a read-only directory simply keeps no cache
+        path = os.path.join(self.directory, COMPILED_LAYOUTS_FILE)
+        temporary = '%s.%d' % (path, os.getpid())
+        try:
+            f = open(temporary, 'wb')
+            try: marshal.dump(self.compiled, f, 2)
+            finally: f.close()
+            os.rename(temporary, path)
+        except (IOError, OSError):
+            if os.path.exists(temporary): os.remove(temporary)
 
 def tryToLoad(fullname):
     if(not os.path.exists(fullname)): return None
     f = open(fullname)
-    try: return Layout([line.strip() for line in f])
+    try: return internLayout([line.strip() for line in f])
     finally: f.close()
+
+def internLayout(layoutText, compiled=None):
+    """
+    The shared Layout of layoutText, built the first time the text is seen
+    (from its compiled form, see Layout.compile, when one is given).
+    """
+    key = tuple(layoutText)
+    if key not in LAYOUT_CACHE:
+        LAYOUT_CACHE[key] = Layout(layoutText, compiled)
+    return LAYOUT_CACHE[key]
@@ -35,7 +35,7 @@ import random
 import game
 import util
 import sys
-import copy
+import mdpSolvers
 
 class MDPAgent(Agent):
 
@@ -43,9 +43,34 @@ class MDPAgent(Agent):
     Contrustor: initialize internal memories
 
     @param self: the class itself
+    @param solver: (optional) the name of the solver (classic/vectorized/prioritized/policy_iteration/modified_policy_iteration); the default value is vectorized when NumPy is available
+    @param update_mode: (optional) how each sweep of the classic or vectorized solver keeps the previous iterate (double_buffer/gauss_seidel); the default value is double_buffer
+    @param warm_start: (optional) a boolean value to indicate whether value iteration is seeded with the previous move's utilities; the default value is false
+    @param cache_dir: (optional) a directory to store compiled layout models in across processes; the default value is None (in-process cache only)
+    @param evaluation_sweeps: (optional) the number of sweeps that evaluate each policy in (modified) policy iteration; the default value is None (exact for policy_iteration, 5 for modified_policy_iteration)
+    @param error_bound: (optional) stop value iteration once the Bellman residual guarantees no utility is off by more than this; the default value is None (total entropy against the convergence tolerance)
+    @param stable_sweeps: (optional) stop value iteration once the action at the agent's location has not changed for this many sweeps; the default value is None (never)
+    @param time_reserve: (optional) stop value iteration once no more than this many milliseconds are left of the move's time budget (under --catchExceptions); the default value is None (never)
+    @param horizon: (optional) only update utilities within this many maze steps of the agent, in place of the solver; the default value is None (the whole maze)
+    @param maximum_horizon: (optional) the largest horizon an ambiguous decision may grow to; the default value is None (4 times the horizon)
+    @param ambiguity: (optional) the utility gap between the two best moves below which the horizon grows; the default value is 1.0
+    @param safety_distance: (optional) the range of the early warning system, overriding the per-layout setting; the default value is None
+    @param threat_decay_rate: (optional) the decay rate of the threat around a ghost; the default value is None (50.0)
+    @param discount_factor: (optional) the discount factor gamma, overriding the per-layout setting; the default value is None
+    @param convergence_tolerance: (optional) the threshold on total entropy; the default value is None (0.1)
+    @param normal_early_stopping_point: (optional) the maximum number of sweeps while food is plentiful; the default value is None (100)
+    @param sparse_early_stopping_point: (optional) the maximum number of sweeps while targets are sparse; the default value is None (200)
+    @param ghostbuster_mode: (optional) which ghostbuster mode (inactive/defensive/offensive) is in use, overriding the per-layout setting; the default value is None
     @return None
     """
-    def __init__(self):
+    def __init__(self, solver=mdpSolvers.DEFAULT_SOLVER, update_mode=mdpSolvers.DOUBLE_BUFFER_MODE, warm_start=False, cache_dir=None, evaluation_sweeps=None, error_bound=None, stable_sweeps=None, time_reserve=None, horizon=None, maximum_horizon=None, ambiguity=1.0,
+                 safety_distance=None, threat_decay_rate=None, discount_factor=None, convergence_tolerance=None, normal_early_stopping_point=None, sparse_early_stopping_point=None, ghostbuster_mode=None):
+        if solver != mdpSolvers.CLASSIC_SOLVER and solver not in mdpSolvers.SOLVERS:
+            raise Exception("Unknown MDP solver: " + str(solver))
+        if update_mode not in mdpSolvers.UPDATE_MODES:
+            raise Exception("Unknown update mode: " + str(update_mode))
+        if update_mode != mdpSolvers.DOUBLE_BUFFER_MODE and (solver not in mdpSolvers.UPDATE_MODE_SOLVERS or horizon != None):
+            raise Exception("Only the classic and vectorized solvers over the whole maze have update modes: " + str(update_mode))
         self.__TOP_RIGHT_WALL_CORNER_smallGrid = (6, 6)
         self.__TOP_RIGHT_WALL_CORNER_mediumClassic = (19, 10)
         self.__CAPSULE = ("CP", 50.0)
@@ -65,6 +90,48 @@ class MDPAgent(Agent):
         self.__DEFENSIVE_GHOSTBUSTER_MODE = "defensive"
         self.__OFFENSIVE_GHOSTBUSTER_MODE = "offensive"
         self.__GHOSTBUSTER_MODE = self.__INACTIVE_GHOSTBUSTER_MODE
+        self.__SOLVER = solver
+        self.__UPDATE_MODE = update_mode
+        self.__WARM_START = self.__as_boolean(warm_start)
+        self.__CACHE_DIR = cache_dir
+        self.__EVALUATION_SWEEPS = None
+        if evaluation_sweeps != None:
+            self.__EVALUATION_SWEEPS = int(evaluation_sweeps)
+        self.__ERROR_BOUND = None
+        if error_bound != None:
+            self.__ERROR_BOUND = float(error_bound)
+        self.__STABLE_SWEEPS = None
+        if stable_sweeps != None:
+            self.__STABLE_SWEEPS = int(stable_sweeps)
+        self.__TIME_RESERVE = None
+        if time_reserve != None:
+            self.__TIME_RESERVE = float(time_reserve) / 1000.0
+        self.__HORIZON = None
+        if horizon != None:
+            self.__HORIZON = int(horizon)
+        self.__MAXIMUM_HORIZON = None
+        if maximum_horizon != None:
+            self.__MAXIMUM_HORIZON = int(maximum_horizon)
+        self.__AMBIGUITY = float(ambiguity)
+        # parameters set through agent arguments win over the per-layout settings of registerInitialState
+        self.__PARAMETERS = dict()
+        if safety_distance != None:
+            self.__PARAMETERS["safety_distance"] = int(safety_distance)
+        if threat_decay_rate != None:
+            self.__PARAMETERS["threat_decay_rate"] = float(threat_decay_rate)
+        if discount_factor != None:
+            self.__PARAMETERS["discount_factor"] = float(discount_factor)
+        if convergence_tolerance != None:
+            self.__PARAMETERS["convergence_tolerance"] = float(convergence_tolerance)
+        if normal_early_stopping_point != None:
+            self.__PARAMETERS["normal_early_stopping_point"] = int(normal_early_stopping_point)
+        if sparse_early_stopping_point != None:
+            self.__PARAMETERS["sparse_early_stopping_point"] = int(sparse_early_stopping_point)
+        if ghostbuster_mode != None:
+            if ghostbuster_mode not in [self.__INACTIVE_GHOSTBUSTER_MODE, self.__DEFENSIVE_GHOSTBUSTER_MODE, self.__OFFENSIVE_GHOSTBUSTER_MODE]:
+                raise Exception("Unknown ghostbuster mode: " + str(ghostbuster_mode))
+            self.__PARAMETERS["ghostbuster_mode"] = ghostbuster_mode
+        self.__apply_parameters()
         self.__states = None
         self.__capsules = None
         self.__foods = None
@@ -72,10 +139,45 @@ class MDPAgent(Agent):
         self.__corners = None
         self.__floors = None
         self.__neighbors = None
+        self.__model = None
+        self.__solver = None
         self.__rewards = None
         self.__utilities = None
         self.__counter = 0
         self.__round = 1
+        self.__statistics = []
+
+    """
+    Interpret an agent argument (e.g. -a warm_start or -a warm_start=False) as a boolean value
+
+    @param self: the class itself
+    @param value: a boolean, or the string/integer passed through the command line
+    @return the boolean value
+    """
+    def __as_boolean(self, value):
+        return str(value).lower() in ["1", "true", "yes", "on"]
+
+    """
+    Apply the parameters set through agent arguments
+
+    @param self: the class itself
+    @return None
+    """
+    def __apply_parameters(self):
+        if "safety_distance" in self.__PARAMETERS:
+            self.__SAFETY_DISTANCE = self.__PARAMETERS["safety_distance"]
+        if "threat_decay_rate" in self.__PARAMETERS:
+            self.__THREAT_DECAY_RATE = self.__PARAMETERS["threat_decay_rate"]
+        if "discount_factor" in self.__PARAMETERS:
+            self.__DISCOUNT_FACTOR = self.__PARAMETERS["discount_factor"]
+        if "convergence_tolerance" in self.__PARAMETERS:
+            self.__CONVERGENCE_TOLERANCE = self.__PARAMETERS["convergence_tolerance"]
+        if "normal_early_stopping_point" in self.__PARAMETERS:
+            self.__NORMAL_EARLY_STOPPING_POINT = self.__PARAMETERS["normal_early_stopping_point"]
+        if "sparse_early_stopping_point" in self.__PARAMETERS:
+            self.__SPARSE_EARLY_STOPPING_POINT = self.__PARAMETERS["sparse_early_stopping_point"]
+        if "ghostbuster_mode" in self.__PARAMETERS:
+            self.__GHOSTBUSTER_MODE = self.__PARAMETERS["ghostbuster_mode"]
 
     """
     Register the initial game state at the start of each round
@@ -86,6 +188,8 @@ class MDPAgent(Agent):
     """
     def registerInitialState(self, state):
         print("Round " + str(self.__round) + " running...")
+        # the agent is reused across games: statistics cover the current game only
+        self.__statistics = []
         corners = api.corners(state)
         # optimal parameter setting for smallGrid
         if self.__TOP_RIGHT_WALL_CORNER_smallGrid in corners:
@@ -97,6 +201,7 @@ class MDPAgent(Agent):
             self.__SAFETY_DISTANCE = 4
             self.__DISCOUNT_FACTOR = 0.7
             self.__GHOSTBUSTER_MODE = self.__INACTIVE_GHOSTBUSTER_MODE
+        self.__apply_parameters()
 
     """
     Reset internal memories and log record at the end of each round
@@ -114,6 +219,8 @@ class MDPAgent(Agent):
         self.__corners = None
         self.__floors = None
         self.__neighbors = None
+        self.__model = None
+        self.__solver = None
         self.__rewards = None
         self.__utilities = None
         self.__counter = 0
@@ -152,8 +259,11 @@ class MDPAgent(Agent):
             self.__capsules = set(api.capsules(state))
         if self.__foods == None:
             self.__foods = set(api.food(state))
+        if self.__model == None:
+            # the compiled maze is shared by every round and game played on the same layout
+            self.__model = mdpSolvers.getModel(state.data.layout.layoutText, state.getWalls(), cache_dir=self.__CACHE_DIR)
         if self.__walls == None:
-			self.__walls = api.walls(state)
+            self.__walls = self.__model.wall_set
         if self.__corners == None:
             # locations or corners on the exterior walls
 			self.__corners = api.corners(state)
@@ -171,27 +281,13 @@ class MDPAgent(Agent):
 					y -= 1
 				self.__corners[i] = (x, y)
         if self.__floors == None:
-            self.__floors = []
-            x_coordinates = []
-            y_coordinates = []
-            for wall in self.__walls:
-                x_coordinates.append(wall[0])
-                y_coordinates.append(wall[1])
-            x_minimum, x_maximum = min(x_coordinates), max(x_coordinates)
-            y_minimum, y_maximum = min(y_coordinates), max(y_coordinates)
-            for x in range(x_minimum, x_maximum + 1):
-                for y in range(y_minimum, y_maximum + 1):
-                    if (x, y) not in self.__walls:
-                        self.__floors.append((x, y))
+            self.__floors = self.__model.floors
         if self.__neighbors == None:
-            self.__neighbors = dict()
-            # displacements: [East, West, North, South]
-            displacements = {(1, 0): Directions.EAST, (-1, 0): Directions.WEST, (0, 1): Directions.NORTH, (0, -1): Directions.SOUTH}
-            for floor in self.__floors:
-                self.__neighbors[floor] = dict()
-                for displacement, direction in displacements.items():
-                    neighbor = (floor[0] + displacement[0], floor[1] + displacement[1])
-                    self.__neighbors[floor][direction] = neighbor
+            self.__neighbors = self.__model.neighbors
+        if self.__solver == None and self.__HORIZON != None:
+            self.__solver = mdpSolvers.LocalHorizonValueIteration(self.__model, self.__DISCOUNT_FACTOR, self.__CONVERGENCE_TOLERANCE, self.__HORIZON, maximum_horizon=self.__MAXIMUM_HORIZON, ambiguity=self.__AMBIGUITY)
+        elif self.__solver == None and self.__SOLVER != mdpSolvers.CLASSIC_SOLVER:
+            self.__solver = mdpSolvers.getSolver(self.__SOLVER, self.__model, self.__DISCOUNT_FACTOR, self.__CONVERGENCE_TOLERANCE, update_mode=self.__UPDATE_MODE, evaluation_sweeps=self.__EVALUATION_SWEEPS)
         # log game state history
         self.__states.append(state)
         # the location of agent
@@ -213,7 +309,7 @@ class MDPAgent(Agent):
     @param self: the class itself
     @param targets: a set of locations of targets
     @param target_value: a tuple of (1) target identifier, and (2) reward value
-    @param walls: a list of locations of walls
+    @param walls: a set of locations of walls
     @param floors: a list of locations of floors (free spaces)
     @param ghosts: a list of locations of ghosts
     @param safety_distance: (optional) the range of the early warning system; the default value is 4
@@ -224,11 +320,7 @@ class MDPAgent(Agent):
         # initialize empty data structures
         rewards = dict()
         utilities = dict()
-        # assign 0.0 reward value to each wall
-        # assign 0.0 utility value to each wall
-        for wall in walls:
-            rewards[wall] = self.__WALL
-            utilities[wall] = self.__WALL
+        # walls are left out: they are never updated and never read by a sweep
         # assign 0.0 reward value to each free space
         # assign +10.0 reward value to each target
         # assign 0.0 utility value each floor
@@ -237,10 +329,16 @@ class MDPAgent(Agent):
             if floor in targets:
                 rewards[floor] = target_value
             utilities[floor] = self.__FREE
-        # assign -500.0 reward value to each ghost
+        # assign -500.0 reward value to each ghost, located at its nearest grid point
+        ghosts = [util.nearestPoint(ghost) for ghost in ghosts]
+        if self.__model.distances is not None:
+            # assign decaying threat reward values by one lookup of the distance to the nearest ghost
+            threatened, threats = self.__model.threat_field(ghosts, safety_distance, threat_decay_rate, self.__HOSTILE[1])
+            for i in threatened:
+                rewards[self.__model.floors[i]] = (self.__HOSTILE[0], threats[i])
+            return (rewards, utilities)
         # assign decaying threat reward values recursively to locations surrounding each ghost
         for ghost in ghosts:
-            ghost = (int(ghost[0]), int(ghost[1]))
             rewards[ghost] = self.__HOSTILE
             queue = util.Queue()
             queue.push(ghost)
@@ -267,18 +365,20 @@ class MDPAgent(Agent):
     Update expected utilities based on Bellman's Equation (Note: just 1 iteration)
 
     @param self: the class itself
-    @param walls: a list of locations of walls
+    @param walls: a set of locations of walls
     @param neighbors: a dictionary that point from a location (key) to its neighbors (value)
-    @param utilities: a dictionary that point from a location (key) to its utilities (value)
+    @param utilities: a dictionary that point from a location (key) to its utilities (value), overwritten with the next iterate
+    @param previous_utilities: a dictionary of the previous iterate; the same dictionary as utilities for an in-place (Gauss-Seidel) update
     @param discount_factor: (optional) the discount factor gamma (range between 0.0 and 1.0) in the Bellman's equation; the default value is 1.0
     @param convergence_tolerance: (optional) the threshold to decide whether the expected utility of each location converges; the default value is 0.0001
-    @return
+    @return a tuple of (1) utilities, (2) a boolean value to indicate whether the utilities converge, (3) total entropy, the summed absolute change of utilities, and (4) the Bellman residual, the largest one
     """
-    def __update_utilities(self, walls, neighbors, rewards, utilities, discount_factor=1.0, convergence_tolerance=0.0001, ignoring_walls=False, maximum_mode=True):
-        previous_utilities = copy.deepcopy(utilities) # old version of utilities
+    def __update_utilities(self, walls, neighbors, rewards, utilities, previous_utilities, discount_factor=1.0, convergence_tolerance=0.0001, ignoring_walls=False, maximum_mode=True):
         fully_convergent = True
         total_entropy = 0.0
-        for location in utilities.keys():
+        residual = 0.0
+        # only floors are ever updated: walls never enter the sweep
+        for location in neighbors:
             if utilities[location][0] == self.__FREE[0]:
                 fully_convergent = False
                 east_utility = 0.0
@@ -354,23 +454,45 @@ class MDPAgent(Agent):
                     if neighbors[location][Directions.WEST] not in walls:
                         south_utility += 0.1 * previous_utilities[neighbors[location][Directions.WEST]][1]
                 """update expected utility"""
+                previous_utility = previous_utilities[location][1]
                 if maximum_mode:
                     utilities[location] = (previous_utilities[location][0], rewards[location][1] + discount_factor * max([east_utility, west_utility, north_utility, south_utility]))
                 else:
                     utilities[location] = (previous_utilities[location][0], rewards[location][1] + discount_factor * min([east_utility, west_utility, north_utility, south_utility]))
                 # if abs(utilities[location][1] - previous_utilities[location][1]) < convergence_tolerance:
                 #     utilities[location] = (self.__CONVERGENT[0], utilities[location][1])
-                total_entropy += abs(utilities[location][1] - previous_utilities[location][1])
+                total_entropy += abs(utilities[location][1] - previous_utility)
+                residual = max(residual, abs(utilities[location][1] - previous_utility))
             if total_entropy < convergence_tolerance:
                 fully_convergent = True
-        return (utilities, fully_convergent, total_entropy)
+        return (utilities, fully_convergent, total_entropy, residual)
+
+    """
+    Seed utilities with the converged utilities of the previous move wherever the reward is unchanged
+
+    @param self: the class itself
+    @param floors: a list of locations of floors (free spaces)
+    @param previous_rewards: a dictionary that point from a location (key) to its reward in the previous move (value)
+    @param previous_utilities: a dictionary that point from a location (key) to its converged utility in the previous move (value)
+    @param rewards: a dictionary that point from a location (key) to its reward in this move (value)
+    @param utilities: a dictionary of freshly initialized utilities, updated in place
+    @return the number of floors whose utilities stay reinitialized
+    """
+    def __warm_start(self, floors, previous_rewards, previous_utilities, rewards, utilities):
+        reinitialized = 0
+        for floor in floors:
+            if rewards[floor] == previous_rewards[floor]:
+                utilities[floor] = previous_utilities[floor]
+            else:
+                reinitialized += 1
+        return reinitialized
 
     """
     Print the data structure of utilities or rewards in a user-friendly grid display
 
     @param self: the class itself
-    @param walls: a list of locations of walls
-    @param grid: a dictionary that point from a location (key) to its reward or utility (value)
+    @param walls: a set of locations of walls
+    @param grid: a dictionary that point from a location (key) to its reward or utility (value); locations missing from it are walls
     @return None
     """
     def __print_data_structure(self, walls, grid):
@@ -384,7 +506,7 @@ class MDPAgent(Agent):
         for y in range(y_maximum, y_minimum - 1, -1):
             line = "{:4s}:".format("y=" + str(y))
             for x in range(x_minimum, x_maximum + 1, 1):
-                grid_value = grid[(x, y)]
+                grid_value = grid.get((x, y), self.__WALL)
                 line += "({:2s},{:>13s})".format(grid_value[0], "{:+9.3f}".format(grid_value[1]))
             print(line)
         x_axis = "     "
@@ -403,19 +525,21 @@ class MDPAgent(Agent):
     """
     def __value_iteration(self, state, debug_mode, deep_debug_mode, ghostbuster_mode):
         """initialize data structures for value iteration"""
+        previous_rewards, previous_utilities = self.__rewards, self.__utilities
         ghosts_states = api.ghostStates(state)
         edible_ghosts = []
         hostile_ghosts = []
         early_stopping_point = self.__NORMAL_EARLY_STOPPING_POINT
         for ghost_state in ghosts_states:
             if ghost_state[1] == 1:
-                edible_ghosts.append((int(ghost_state[0][0]), int(ghost_state[0][1])))
+                edible_ghosts.append(util.nearestPoint(ghost_state[0]))
             else:
                 hostile_ghosts.append(ghost_state[0])
         if debug_mode:
             print("\tedible_ghosts=" + str(edible_ghosts))
             print("\thostile_ghosts=" + str(hostile_ghosts))
         # inactive ghostbuster mode
+        targets, target_value = self.__foods, self.__FOOD
         self.__rewards, self.__utilities = self.__initialize_data_structures(self.__foods, self.__FOOD, self.__walls, self.__floors, hostile_ghosts, safety_distance=self.__SAFETY_DISTANCE, threat_decay_rate=self.__THREAT_DECAY_RATE)
         early_stopping_point = self.__NORMAL_EARLY_STOPPING_POINT
         if len(self.__foods) < 10:
@@ -423,32 +547,79 @@ class MDPAgent(Agent):
         # defensive ghostbuster mode
         if ghostbuster_mode == self.__DEFENSIVE_GHOSTBUSTER_MODE:
             if len(edible_ghosts) > 0:
+                targets, target_value = edible_ghosts, self.__EDIBLE
                 self.__rewards, self.__utilities = self.__initialize_data_structures(edible_ghosts, self.__EDIBLE, self.__walls, self.__floors, hostile_ghosts, safety_distance=self.__SAFETY_DISTANCE, threat_decay_rate=self.__THREAT_DECAY_RATE)
                 early_stopping_point = self.__SPARSE_EARLY_STOPPING_POINT
         # offensive ghostbuster_mode
         if ghostbuster_mode == self.__OFFENSIVE_GHOSTBUSTER_MODE:
             if len(edible_ghosts) > 0:
+                targets, target_value = edible_ghosts, self.__EDIBLE
                 self.__rewards, self.__utilities = self.__initialize_data_structures(edible_ghosts, self.__EDIBLE, self.__walls, self.__floors, hostile_ghosts, safety_distance=self.__SAFETY_DISTANCE, threat_decay_rate=self.__THREAT_DECAY_RATE)
                 early_stopping_point = self.__SPARSE_EARLY_STOPPING_POINT
             elif len(self.__capsules) > 0:
+                targets, target_value = self.__capsules, self.__CAPSULE
                 self.__rewards, self.__utilities = self.__initialize_data_structures(self.__capsules, self.__CAPSULE, self.__walls, self.__floors, hostile_ghosts, safety_distance=self.__SAFETY_DISTANCE, threat_decay_rate=self.__THREAT_DECAY_RATE)
                 early_stopping_point = self.__SPARSE_EARLY_STOPPING_POINT
+        """warm start: only cells whose rewards changed since the previous move start from scratch"""
+        reinitialized = len(self.__floors)
+        if self.__WARM_START and previous_utilities != None:
+            reinitialized = self.__warm_start(self.__floors, previous_rewards, previous_utilities, self.__rewards, self.__utilities)
+        if debug_mode:
+            print("\treinitialized=" + str(reinitialized))
         """use value iteration to update utilites until convergence or early stopping point"""
         stopping_point = None
-        for i in range(early_stopping_point):
-            stopping_point = i + 1
-            self.__utilities, fully_convergent, total_entropy = self.__update_utilities(self.__walls, self.__neighbors, self.__rewards, self.__utilities, discount_factor=self.__DISCOUNT_FACTOR, convergence_tolerance=self.__CONVERGENCE_TOLERANCE, ignoring_walls=False, maximum_mode=True)
-            if deep_debug_mode:
-                self.__print_data_structure(self.__walls, self.__rewards)
-                self.__print_data_structure(self.__walls, self.__utilities)
-                print("\ttotal_entropy=" + "{:+10.3f}".format(total_entropy))
-            if fully_convergent:
-                break
+        # the locations the agent can move to, watched when the action has to stay stable
+        agent_location = api.whereAmI(state)
+        candidates = [self.__neighbors[agent_location][direction] for direction in api.legalActions(state) if direction != Directions.STOP]
+        if self.__SOLVER != mdpSolvers.CLASSIC_SOLVER or self.__HORIZON != None:
+            candidates = [self.__model.index[candidate] for candidate in candidates]
+        stopping_rule = mdpSolvers.StoppingRule(self.__DISCOUNT_FACTOR, self.__CONVERGENCE_TOLERANCE, error_bound=self.__ERROR_BOUND, stable_sweeps=self.__STABLE_SWEEPS, candidates=candidates, time_reserve=self.__TIME_RESERVE)
+        horizon = None
+        if self.__HORIZON != None:
+            # only the neighborhood of the agent is solved; the rest of the maze keeps its utilities
+            allocations = 0
+            region, utilities, stopping_point, total_entropy = self.__solver.solve(self.__rewards, self.__utilities, self.__model.index[agent_location], candidates, [self.__model.index[target] for target in targets], target_value[1], early_stopping_point, stopping_rule=stopping_rule)
+            backups = self.__solver.backups
+            horizon = self.__solver.last_horizon
+            for i in range(len(region)):
+                self.__utilities[self.__model.floors[region[i]]] = (self.__FREE[0], utilities[i])
+        elif self.__SOLVER == mdpSolvers.CLASSIC_SOLVER:
+            # double buffering: one extra dictionary per move, swapped with the current one each sweep
+            allocations = 0
+            scratch = self.__utilities
+            if self.__UPDATE_MODE == mdpSolvers.DOUBLE_BUFFER_MODE:
+                scratch = dict(self.__utilities)
+                allocations += 1
+            for i in range(early_stopping_point):
+                stopping_point = i + 1
+                updated_utilities, fully_convergent, total_entropy, residual = self.__update_utilities(self.__walls, self.__neighbors, self.__rewards, scratch, self.__utilities, discount_factor=self.__DISCOUNT_FACTOR, convergence_tolerance=self.__CONVERGENCE_TOLERANCE, ignoring_walls=False, maximum_mode=True)
+                self.__utilities, scratch = updated_utilities, self.__utilities
+                if deep_debug_mode:
+                    self.__print_data_structure(self.__walls, self.__rewards)
+                    self.__print_data_structure(self.__walls, self.__utilities)
+                    print("\ttotal_entropy=" + "{:+10.3f}".format(total_entropy))
+                candidate_utilities = dict([(candidate, self.__utilities[candidate][1]) for candidate in candidates])
+                if stopping_rule.converged(total_entropy, residual, candidate_utilities):
+                    break
+            backups = stopping_point * len(self.__floors)
+        else:
+            # the solver preallocated its buffers when the model was compiled
+            allocations = 0
+            utilities, stopping_point, total_entropy = self.__solver.solve(self.__model.vectorize(self.__rewards), self.__model.vectorize(self.__utilities), early_stopping_point, stopping_rule=stopping_rule)
+            backups = self.__solver.backups
+            # write the converged utilities back so that action selection and debug output stay unchanged
+            for i in range(self.__model.size()):
+                self.__utilities[self.__model.floors[i]] = (self.__FREE[0], utilities[i])
+        self.__statistics.append({"sweeps": stopping_point, "backups": backups, "allocations": allocations, "reinitialized": reinitialized, "residual": stopping_rule.residual, "error_bound": stopping_rule.bound(stopping_rule.residual), "stopped_by": stopping_rule.reason, "horizon": horizon})
         if debug_mode:
             self.__print_data_structure(self.__walls, self.__rewards)
             self.__print_data_structure(self.__walls, self.__utilities)
             print("\ttotal_entropy=" + "{:+10.3f}".format(total_entropy))
             print("\tstopping_point=" + str(stopping_point))
+            print("\tstopped_by=" + stopping_rule.reason)
+            print("\terror_bound=" + str(stopping_rule.bound(stopping_rule.residual)))
+            print("\tbackups=" + str(backups))
+            print("\thorizon=" + str(horizon))
 
     """
     Use maximum expected utility to decide which direction to go next
@@ -484,6 +655,15 @@ class MDPAgent(Agent):
             print("\taction=" + str(action))
         return action
 
+    """
+    Report per-move solver statistics collected since the current game started
+
+    @param self: the class itself
+    @return a list with one dictionary per move: number of sweeps, Bellman backups, utility buffers allocated, floors reinitialized, the last Bellman residual, the error bound it guarantees, why the solve stopped and the horizon solved
+    """
+    def getStatistics(self):
+        return self.__statistics
+
     """
     Decide which direction to go based on the current game state
 
@@ -0,0 +1,920 @@
+# mdpSolvers.py
+#
+# Array-backed solvers for the Markov Decision Process that MDPAgent
+# builds over the floor cells of a maze.
+#
+# The classic solver in mdpAgents.py walks a dictionary of (tag, value)
+# tuples one location at a time. The solvers here compile the maze once
+# into an MDPModel (a floor index and a dense transition tensor) so that
+# every Bellman sweep runs as a handful of NumPy operations.
+
+from game import Directions
+import hashlib
+import os
+import util
+import zipfile
+import zlib
+
+try:
+    import numpy
+    _NUMPY_ENABLED = True
+except:
+    _NUMPY_ENABLED = False
+
+try:
+    import scipy.sparse
+    import scipy.sparse.linalg
+    _SCIPY_ENABLED = True
+except:
+    _SCIPY_ENABLED = False
+
+# the order of actions along the first axis of every transition structure
+ACTIONS = [Directions.EAST, Directions.WEST, Directions.NORTH, Directions.SOUTH]
+
+# the motion model: (intended direction, left of it, right of it)
+DISPLACEMENTS = {Directions.EAST: (1, 0), Directions.WEST: (-1, 0), Directions.NORTH: (0, 1), Directions.SOUTH: (0, -1)}
+INTENDED_PROBABILITY = 0.8
+SIDEWAYS_PROBABILITY = 0.1
+
+# (intended direction, slip) outcomes that do not bounce back off a wall: the classic update of MDPAgent
+# drops the right-hand slip of SOUTH into a wall, and every solver reproduces it to play the same policy
+DROPPED_OUTCOMES = [(Directions.SOUTH, Directions.WEST)]
+
+# how a sweep stores the previous iterate: two swapped buffers, or none at all (in place)
+DOUBLE_BUFFER_MODE = "double_buffer"
+GAUSS_SEIDEL_MODE = "gauss_seidel"
+UPDATE_MODES = [DOUBLE_BUFFER_MODE, GAUSS_SEIDEL_MODE]
+
+# the distance recorded between floors with no path between them
+UNREACHABLE = 65535
+
+# the sweeps that evaluate each policy in modified policy iteration
+DEFAULT_EVALUATION_SWEEPS = 5
+
+# why a solve stopped, as reported by StoppingRule.reason
+ENTROPY_STOPPING = "entropy"
+RESIDUAL_STOPPING = "residual"
+STABLE_ACTION_STOPPING = "stable_action"
+STABLE_POLICY_STOPPING = "stable_policy"
+TIME_STOPPING = "time_budget"
+EARLY_STOPPING = "early_stopping_point"
+
+class MDPModel:
+
+    """
+    Contrustor: compile the floor index, neighbor indices and the transition tensor of a maze
+
+    @param self: the class itself
+    @param walls: a list of locations of walls
+    @param floors: (optional) a precompiled list of floors, e.g. loaded from disk; the default value is None
+    @param transitions: (optional) a precompiled transition tensor, e.g. loaded from disk; the default value is None
+    @param distances: (optional) a precompiled all-pairs distance table, e.g. loaded from disk; the default value is None
+    @return None
+    """
+    def __init__(self, walls, floors=None, transitions=None, distances=None):
+        self.walls = walls
+        # constant-time wall membership, independent of how many walls the maze has
+        self.wall_set = frozenset(walls)
+        if floors == None:
+            x_coordinates = [wall[0] for wall in walls]
+            y_coordinates = [wall[1] for wall in walls]
+            x_minimum, x_maximum = min(x_coordinates), max(x_coordinates)
+            y_minimum, y_maximum = min(y_coordinates), max(y_coordinates)
+            # floors are enumerated in the same order as MDPAgent.__floors
+            floors = []
+            for x in range(x_minimum, x_maximum + 1):
+                for y in range(y_minimum, y_maximum + 1):
+                    if (x, y) not in self.wall_set:
+                        floors.append((x, y))
+        self.floors = floors
+        self.index = dict()
+        for i in range(len(self.floors)):
+            self.index[self.floors[i]] = i
+        # neighbors[floor][direction]: the adjacent location, wall or not, as MDPAgent.__neighbors
+        self.neighbors = dict()
+        for floor in self.floors:
+            self.neighbors[floor] = dict()
+            for direction in ACTIONS:
+                dx, dy = DISPLACEMENTS[direction]
+                self.neighbors[floor][direction] = (floor[0] + dx, floor[1] + dy)
+        # successor_lists[a][i]: the floor reached from floor i by moving in ACTIONS[a]; bounce back off walls
+        self.successor_lists = []
+        for direction in ACTIONS:
+            self.successor_lists.append([self.index.get(self.neighbors[floor][direction], i) for i, floor in enumerate(self.floors)])
+        # outcomes[i][a]: the (floor, probability) pairs of choosing ACTIONS[a] in floor i, in the order of the classic update
+        self.outcomes = []
+        for i in range(len(self.floors)):
+            outcomes = []
+            for intended in ACTIONS:
+                outcome = []
+                for direction, probability in [(intended, INTENDED_PROBABILITY), (Directions.LEFT[intended], SIDEWAYS_PROBABILITY), (Directions.RIGHT[intended], SIDEWAYS_PROBABILITY)]:
+                    j = self.index.get(self.neighbors[self.floors[i]][direction])
+                    if j == None and (intended, direction) in DROPPED_OUTCOMES:
+                        continue
+                    if j == None:
+                        j = i
+                    outcome.append((j, probability))
+                outcomes.append(outcome)
+            self.outcomes.append(outcomes)
+        # predecessors[j]: (floor i, the largest probability over actions of reaching j from i) for every i that can reach j
+        self.predecessors = [[] for i in range(len(self.floors))]
+        for i in range(len(self.floors)):
+            probabilities = dict()
+            for outcome in self.outcomes[i]:
+                reached = dict()
+                for j, probability in outcome:
+                    reached[j] = reached.get(j, 0.0) + probability
+                for j in reached:
+                    probabilities[j] = max(probabilities.get(j, 0.0), reached[j])
+            for j in sorted(probabilities.keys()):
+                self.predecessors[j].append((i, probabilities[j]))
+        self.successors = None
+        self.transitions = None
+        self.flat_transitions = None
+        self.distances = None
+        if not _NUMPY_ENABLED:
+            return
+        self.successors = numpy.array(self.successor_lists, dtype=numpy.intp).reshape(len(ACTIONS), len(self.floors))
+        # transitions[a][i][j]: the probability of ending in floor j after choosing ACTIONS[a] in floor i
+        if transitions is None:
+            transitions = numpy.zeros((len(ACTIONS), len(self.floors), len(self.floors)))
+            for i in range(len(self.floors)):
+                for a in range(len(ACTIONS)):
+                    for j, probability in self.outcomes[i][a]:
+                        transitions[a, i, j] += probability
+        self.transitions = transitions
+        # flattened view used by the sweeps: one matrix product yields every action value
+        self.flat_transitions = self.transitions.reshape(len(ACTIONS) * len(self.floors), len(self.floors))
+        # distances[i][j]: the maze distance between floors i and j (UNREACHABLE if there is no path)
+        if distances is None:
+            distances = self.__compile_distances()
+        self.distances = distances
+
+    """
+    Compute the maze distances between all pairs of floors with a breadth-first search from every floor at once
+
+    @param self: the class itself
+    @return a matrix of uint16 distances
+    """
+    def __compile_distances(self):
+        distances = numpy.full((len(self.floors), len(self.floors)), UNREACHABLE, dtype=numpy.uint16)
+        numpy.fill_diagonal(distances, 0)
+        reached = numpy.eye(len(self.floors), dtype=bool)
+        frontier = reached.copy()
+        distance = 0
+        while frontier.any():
+            distance += 1
+            # floor j joins the frontier of a source when one of its neighbors was on it
+            expanded = numpy.zeros_like(frontier)
+            for a in range(len(ACTIONS)):
+                expanded |= frontier[:, self.successors[a]]
+            frontier = expanded & ~reached
+            reached |= frontier
+            distances[frontier] = distance
+        return distances
+
+    """
+    Paint the decaying threat around hostile ghosts: a floor at maze distance d from the nearest ghost is worth hostile_reward + d * threat_decay_rate
+
+    @param self: the class itself
+    @param ghosts: a list of locations of ghosts, on grid points
+    @param safety_distance: the range of the early warning system
+    @param threat_decay_rate: the decay rate of negative threat utility initialized to spaces surrounding a ghost
+    @param hostile_reward: the (negative) reward of a ghost's own location
+    @return a tuple of (1) the indices of the threatened floors, and (2) a vector of threat rewards over all floors
+    """
+    def threat_field(self, ghosts, safety_distance, threat_decay_rate, hostile_reward):
+        if len(ghosts) == 0:
+            return ([], None)
+        nearest = self.distances[[self.index[ghost] for ghost in ghosts]].min(axis=0).astype(float)
+        threats = hostile_reward + threat_decay_rate * nearest
+        # the threat spreads up to safety_distance - 1 steps and never reaches a non-negative reward
+        threatened = (nearest == 0) | ((nearest <= safety_distance - 1) & (threats < 0.0))
+        return (numpy.nonzero(threatened)[0], threats)
+
+    """
+    The number of floor cells (states) in the model
+
+    @param self: the class itself
+    @return the number of floor cells
+    """
+    def size(self):
+        return len(self.floors)
+
+    """
+    Gather per-location values from a dictionary of (tag, value) tuples into a vector over floors
+
+    @param self: the class itself
+    @param grid: a dictionary that point from a location (key) to its reward or utility (value)
+    @param indices: (optional) the indices of the floors to gather; the default value is None (every floor)
+    @return a vector of values ordered like self.floors, or like indices
+    """
+    def vectorize(self, grid, indices=None):
+        if indices is None:
+            return numpy.array([grid[floor][1] for floor in self.floors], dtype=float)
+        return numpy.array([grid[self.floors[i]][1] for i in indices], dtype=float)
+
+    """
+    Collect the floors within a number of maze steps of a floor with a breadth-first search that never looks further
+
+    @param self: the class itself
+    @param center: the index of the floor to start from
+    @param horizon: the largest number of maze steps
+    @return a tuple of (1) the indices of floors closer than horizon, and (2) the indices of floors exactly horizon steps away
+    """
+    def region(self, center, horizon):
+        interior, boundary = [], [center]
+        visited = set([center])
+        for distance in range(horizon):
+            interior += boundary
+            frontier = []
+            for i in boundary:
+                for successors in self.successor_lists:
+                    j = successors[i]
+                    if j not in visited:
+                        visited.add(j)
+                        frontier.append(j)
+            boundary = frontier
+        return (interior, boundary)
+
+    """
+    Compute the Bellman backup of a single floor (Note: does not write it)
+
+    @param self: the class itself
+    @param i: the index of the floor
+    @param rewards: a vector of rewards over floors
+    @param utilities: a vector of utilities over floors
+    @param discount_factor: the discount factor gamma in the Bellman's equation
+    @return the backed up utility of floor i
+    """
+    def backup(self, i, rewards, utilities, discount_factor):
+        maximum_utility = None
+        for outcome in self.outcomes[i]:
+            utility = 0.0
+            for j, probability in outcome:
+                utility += probability * utilities[j]
+            if maximum_utility == None or utility > maximum_utility:
+                maximum_utility = utility
+        return rewards[i] + discount_factor * maximum_utility
+
+class StoppingRule:
+
+    """
+    Contrustor: decide when a solve may stop, after each sweep
+
+    Without an error bound a solve stops once the total entropy of a sweep falls below the convergence tolerance.
+    With an error bound it stops once the max-norm Bellman residual r guarantees max |U - U*| <= gamma / (1 - gamma) * r <= error_bound.
+    With stable sweeps it also stops once the greedy action at Pacman's location has not changed for that many sweeps.
+    With a time reserve it also stops once no more than that many seconds are left of the move's time budget (see util.timeRemaining).
+
+    @param self: the class itself
+    @param discount_factor: the discount factor gamma (range between 0.0 and 1.0) in the Bellman's equation
+    @param convergence_tolerance: the threshold on total entropy, used when no error bound is given
+    @param error_bound: (optional) the largest error of any utility the solve has to guarantee; the default value is None (total entropy)
+    @param stable_sweeps: (optional) the number of sweeps the greedy action has to stay unchanged; the default value is None (never)
+    @param candidates: (optional) the keys of the utilities of the locations Pacman can move to, one per legal action; the default value is None
+    @param time_reserve: (optional) the seconds of the move's time budget to keep for acting on the utilities; the default value is None (never)
+    @return None
+    """
+    def __init__(self, discount_factor, convergence_tolerance, error_bound=None, stable_sweeps=None, candidates=None, time_reserve=None):
+        self.discount_factor = discount_factor
+        self.convergence_tolerance = convergence_tolerance
+        self.error_bound = error_bound
+        self.residual_threshold = None
+        # the bound needs gamma < 1; without discounting only the total entropy is left to test
+        if error_bound != None and 0.0 < discount_factor < 1.0:
+            self.residual_threshold = error_bound * (1.0 - discount_factor) / discount_factor
+        elif error_bound != None and discount_factor == 0.0:
+            self.residual_threshold = float("inf")
+        self.stable_sweeps = stable_sweeps
+        self.time_reserve = time_reserve
+        self.reset(candidates)
+
+    """
+    Forget every sweep recorded so far, e.g. before the same move is solved again over a larger region
+
+    @param self: the class itself
+    @param candidates: the keys of the utilities of the locations Pacman can move to, one per legal action
+    @return None
+    """
+    def reset(self, candidates):
+        self.candidates = candidates
+        if not self.stable_sweeps:
+            self.candidates = None
+        self.action = None
+        self.stable = 0
+        self.residual = None
+        self.reason = EARLY_STOPPING
+
+    """
+    The guaranteed largest error of any utility after a sweep with the given max-norm Bellman residual
+
+    @param self: the class itself
+    @param residual: the largest absolute change of any utility in the last sweep
+    @return the bound, or None without discounting
+    """
+    def bound(self, residual):
+        if residual == None or self.discount_factor >= 1.0:
+            return None
+        return self.discount_factor / (1.0 - self.discount_factor) * residual
+
+    """
+    Record one sweep and decide whether the solve may stop
+
+    @param self: the class itself
+    @param total_entropy: the summed absolute change of utilities in the sweep
+    @param residual: the largest absolute change of any utility in the sweep
+    @param utilities: the utilities after the sweep, indexable by the candidates
+    @return a boolean value to indicate whether the solve may stop
+    """
+    def converged(self, total_entropy, residual, utilities):
+        self.residual = residual
+        if self.residual_threshold != None:
+            if residual < self.residual_threshold:
+                self.reason = RESIDUAL_STOPPING
+                return True
+        elif total_entropy < self.convergence_tolerance:
+            self.reason = ENTROPY_STOPPING
+            return True
+        if self.candidates != None:
+            # the first of equally good actions, as in MDPAgent's maximum expected utility
+            action, tied = 0, True
+            for k in range(1, len(self.candidates)):
+                if utilities[self.candidates[k]] != utilities[self.candidates[0]]:
+                    tied = False
+                if utilities[self.candidates[k]] > utilities[self.candidates[action]]:
+                    action = k
+            # while every candidate is equally good nothing has reached the agent yet
+            if tied:
+                self.action, self.stable = None, 0
+            elif action == self.action:
+                self.stable += 1
+            else:
+                self.action, self.stable = action, 1
+            if self.stable >= self.stable_sweeps:
+                self.reason = STABLE_ACTION_STOPPING
+                return True
+        # an anytime solve: act on the utilities so far rather than overrun the move's deadline
+        if self.time_reserve != None and util.timeRemaining() <= self.time_reserve:
+            self.reason = TIME_STOPPING
+            return True
+        return False
+
+class VectorizedValueIteration:
+
+    """
+    Contrustor: bind the solver to a compiled model and preallocate its utility buffers
+
+    @param self: the class itself
+    @param model: the compiled MDPModel of the maze
+    @param discount_factor: the discount factor gamma (range between 0.0 and 1.0) in the Bellman's equation
+    @param convergence_tolerance: the threshold on total entropy to decide whether the utilities converge
+    @param update_mode: (optional) double_buffer swaps two preallocated vectors each sweep, gauss_seidel updates one vector in place in red/black order; the default value is double_buffer
+    @return None
+    """
+    def __init__(self, model, discount_factor, convergence_tolerance, update_mode=DOUBLE_BUFFER_MODE):
+        if update_mode not in UPDATE_MODES:
+            raise Exception("Unknown update mode: " + str(update_mode))
+        self.model = model
+        self.discount_factor = discount_factor
+        self.convergence_tolerance = convergence_tolerance
+        self.update_mode = update_mode
+        # every buffer a sweep touches is allocated here, once per model
+        self.__buffers = [numpy.zeros(model.size()), numpy.zeros(model.size())]
+        self.__action_values = numpy.zeros(len(ACTIONS) * model.size())
+        self.__residuals = numpy.zeros(model.size())
+        self.allocations = len(self.__buffers) + 2
+        if update_mode == GAUSS_SEIDEL_MODE:
+            # a floor's outcomes are itself and its four neighbors, which all lie on the other color of the checkerboard:
+            # updating every floor of one color at once is a Gauss-Seidel sweep in red/black order
+            colors = numpy.array([(x + y) % 2 for x, y in model.floors], dtype=int)
+            self.__colors = []
+            for color in [0, 1]:
+                cells = numpy.nonzero(colors == color)[0]
+                transitions = model.transitions[:, cells, :].reshape(len(ACTIONS) * len(cells), model.size())
+                self.__colors.append((cells, transitions, numpy.zeros(len(ACTIONS) * len(cells)), numpy.zeros(len(cells)), numpy.zeros(len(cells))))
+            self.allocations += 6
+        self.backups = 0
+
+    """
+    Update expected utilities based on Bellman's Equation into a preallocated buffer (Note: just 1 iteration)
+
+    @param self: the class itself
+    @param rewards: a vector of rewards over floors
+    @param utilities: a vector of utilities over floors (the previous iterate)
+    @param updated_utilities: the vector to write the next iterate into
+    @return a tuple of (1) total entropy, the summed absolute change of utilities, and (2) the Bellman residual, the largest one
+    """
+    def update_utilities(self, rewards, utilities, updated_utilities):
+        numpy.dot(self.model.flat_transitions, utilities, out=self.__action_values)
+        numpy.max(self.__action_values.reshape(len(ACTIONS), self.model.size()), axis=0, out=updated_utilities)
+        updated_utilities *= self.discount_factor
+        updated_utilities += rewards
+        numpy.subtract(updated_utilities, utilities, out=self.__residuals)
+        numpy.abs(self.__residuals, out=self.__residuals)
+        return (self.__residuals.sum(), self.__residuals.max())
+
+    """
+    Update expected utilities based on Bellman's Equation in place, one color of the checkerboard at a time (Note: just 1 iteration)
+
+    @param self: the class itself
+    @param rewards: a vector of rewards over floors
+    @param utilities: a vector of utilities over floors, overwritten with the next iterate
+    @return a tuple of (1) total entropy, the summed absolute change of utilities, and (2) the Bellman residual, the largest one
+    """
+    def update_utilities_in_place(self, rewards, utilities):
+        total_entropy, residual = 0.0, 0.0
+        for cells, transitions, action_values, updated_utilities, changes in self.__colors:
+            numpy.dot(transitions, utilities, out=action_values)
+            numpy.max(action_values.reshape(len(ACTIONS), len(cells)), axis=0, out=updated_utilities)
+            updated_utilities *= self.discount_factor
+            updated_utilities += rewards.take(cells, out=changes)
+            numpy.subtract(updated_utilities, utilities.take(cells, out=changes), out=changes)
+            numpy.abs(changes, out=changes)
+            total_entropy += changes.sum()
+            residual = max(residual, changes.max())
+            utilities.put(cells, updated_utilities)
+        return (total_entropy, residual)
+
+    """
+    Use value iteration to update utilities until convergence or early stopping point
+
+    @param self: the class itself
+    @param rewards: a vector of rewards over floors
+    @param utilities: a vector of initial utilities over floors
+    @param early_stopping_point: the maximum number of sweeps
+    @param stopping_rule: (optional) the StoppingRule consulted after each sweep; the default value is None (total entropy against the convergence tolerance)
+    @return a tuple of (1) utilities, (2) the number of sweeps performed, and (3) total entropy of the last sweep; the utilities vector is owned by the solver and overwritten by the next solve
+    """
+    def solve(self, rewards, utilities, early_stopping_point, stopping_rule=None):
+        if stopping_rule == None:
+            stopping_rule = StoppingRule(self.discount_factor, self.convergence_tolerance)
+        current, scratch = self.__buffers
+        current[:] = utilities
+        stopping_point, total_entropy = 0, None
+        for i in range(early_stopping_point):
+            stopping_point = i + 1
+            if self.update_mode == GAUSS_SEIDEL_MODE:
+                total_entropy, residual = self.update_utilities_in_place(rewards, current)
+            else:
+                total_entropy, residual = self.update_utilities(rewards, current, scratch)
+                current, scratch = scratch, current
+            if stopping_rule.converged(total_entropy, residual, current):
+                break
+        self.__buffers = [current, scratch]
+        self.backups = stopping_point * self.model.size()
+        return (current, stopping_point, total_entropy)
+
+class PrioritizedSweeping:
+
+    """
+    Contrustor: bind the solver to a compiled model
+
+    Prioritized sweeping needs fewer backups than value iteration, but each one is a Python-level update of one floor,
+    so per move it is much slower than VectorizedValueIteration; it is kept for comparing backup counts.
+
+    @param self: the class itself
+    @param model: the compiled MDPModel of the maze
+    @param discount_factor: the discount factor gamma (range between 0.0 and 1.0) in the Bellman's equation
+    @param convergence_tolerance: the threshold on total entropy; each floor may leave at most its share of it unresolved
+    @return None
+    """
+    def __init__(self, model, discount_factor, convergence_tolerance):
+        self.model = model
+        self.discount_factor = discount_factor
+        self.convergence_tolerance = convergence_tolerance
+        self.threshold = convergence_tolerance / model.size()
+        self.__utilities = numpy.zeros(model.size())
+        self.__action_values = numpy.zeros(len(ACTIONS) * model.size())
+        self.allocations = 2
+        self.backups = 0
+
+    """
+    Back up floors in order of their Bellman residual until no residual exceeds the threshold
+
+    @param self: the class itself
+    @param rewards: a vector of rewards over floors
+    @param utilities: a vector of initial utilities over floors
+    @param early_stopping_point: the budget of backups, counted in sweeps over all floors
+    @param stopping_rule: (optional) the StoppingRule whose residual threshold replaces the threshold and which is consulted after each sweep's worth of backups; its residual is left at the largest pending priority; the default value is None
+    @return a tuple of (1) utilities, (2) the backups performed counted in sweeps, and (3) total entropy of all backups; the utilities vector is owned by the solver and overwritten by the next solve
+    """
+    def solve(self, rewards, utilities, early_stopping_point, stopping_rule=None):
+        if stopping_rule == None:
+            stopping_rule = StoppingRule(self.discount_factor, self.convergence_tolerance)
+        threshold = self.threshold
+        if stopping_rule.residual_threshold != None:
+            threshold = stopping_rule.residual_threshold
+        current = self.__utilities
+        current[:] = utilities
+        # seed the queue with the exact residual of every floor, computed in one vectorized sweep
+        numpy.dot(self.model.flat_transitions, current, out=self.__action_values)
+        residuals = numpy.abs(rewards + self.discount_factor * self.__action_values.reshape(len(ACTIONS), self.model.size()).max(axis=0) - current)
+        queue = util.PriorityQueue()
+        # priorities[i]: a bound on the residual of every floor not backed up since; only those over the threshold are queued
+        priorities = dict(enumerate(residuals.tolist()))
+        for i in numpy.nonzero(residuals > threshold)[0]:
+            i = int(i)
+            queue.push(i, -residuals[i])
+        self.backups, total_entropy, sweep_entropy = 0, 0.0, 0.0
+        budget = early_stopping_point * self.model.size()
+        while not queue.isEmpty() and self.backups < budget:
+            i = queue.pop()
+            # stale entries of a floor that was already backed up are skipped
+            if priorities.get(i, 0.0) <= threshold:
+                continue
+            del priorities[i]
+            utility = self.model.backup(i, rewards, current, self.discount_factor)
+            change = abs(utility - current[i])
+            current[i] = utility
+            self.backups += 1
+            total_entropy += change
+            sweep_entropy += change
+            # a predecessor's residual grows by at most gamma * P(i | predecessor) * change
+            for predecessor, probability in self.model.predecessors[i]:
+                priority = priorities.get(predecessor, 0.0) + self.discount_factor * probability * change
+                priorities[predecessor] = priority
+                if priority > threshold:
+                    queue.push(predecessor, -priority)
+            # the stopping rule is consulted once per sweep's worth of backups
+            if self.backups % self.model.size() == 0:
+                if stopping_rule.converged(sweep_entropy, max(priorities.values() + [0.0]), current):
+                    break
+                sweep_entropy = 0.0
+        # the residual left is bounded by the largest priority still pending
+        stopping_rule.residual = max(priorities.values() + [0.0])
+        if queue.isEmpty() and stopping_rule.reason == EARLY_STOPPING:
+            # every pending residual is below the threshold
+            stopping_rule.reason = ENTROPY_STOPPING
+            if stopping_rule.residual_threshold != None:
+                stopping_rule.reason = RESIDUAL_STOPPING
+        stopping_point = (self.backups + self.model.size() - 1) // self.model.size()
+        return (current, stopping_point, total_entropy)
+
+class PolicyIteration:
+
+    """
+    Contrustor: bind the solver to a compiled model
+
+    @param self: the class itself
+    @param model: the compiled MDPModel of the maze
+    @param discount_factor: the discount factor gamma (range between 0.0 and 1.0) in the Bellman's equation
+    @param convergence_tolerance: the threshold on total entropy to decide whether the utilities converge
+    @param evaluation_sweeps: (optional) the number of sweeps that evaluate each policy; the default value is None (an exact linear solve)
+    @return None
+    """
+    def __init__(self, model, discount_factor, convergence_tolerance, evaluation_sweeps=None):
+        self.model = model
+        self.discount_factor = discount_factor
+        self.convergence_tolerance = convergence_tolerance
+        # (I - gamma * P) is singular without discounting, so an undiscounted policy is evaluated by sweeps
+        if evaluation_sweeps == None and discount_factor >= 1.0:
+            evaluation_sweeps = DEFAULT_EVALUATION_SWEEPS
+        self.evaluation_sweeps = evaluation_sweeps
+        self.allocations = 0
+        self.backups = 0
+
+    """
+    Improve a policy greedily with one Bellman backup of every floor, keeping the current action wherever it is as good as the best one
+
+    @param self: the class itself
+    @param rewards: a vector of rewards over floors
+    @param utilities: a vector of utilities over floors
+    @param policy: a vector of the current action indices over floors, or None before the first improvement
+    @return a tuple of (1) a vector of action indices over floors, and (2) the backed up utilities over floors
+    """
+    def improve_policy(self, rewards, utilities, policy):
+        action_values = numpy.dot(self.model.flat_transitions, utilities).reshape(len(ACTIONS), self.model.size())
+        greedy = action_values.argmax(axis=0)
+        self.backups += self.model.size()
+        cells = numpy.arange(self.model.size())
+        if policy is not None:
+            keep = action_values[policy, cells] >= action_values[greedy, cells] - 1e-9
+            greedy = numpy.where(keep, policy, greedy)
+        return (greedy, rewards + self.discount_factor * action_values[greedy, cells])
+
+    """
+    The transition matrix over floors when every floor follows its action in the policy
+
+    @param self: the class itself
+    @param policy: a vector of action indices over floors
+    @return a sparse matrix when SciPy is available, a dense one otherwise
+    """
+    def policy_transitions(self, policy):
+        if not _SCIPY_ENABLED:
+            return self.model.transitions[policy, numpy.arange(self.model.size())]
+        rows, columns, probabilities = [], [], []
+        for i in range(self.model.size()):
+            for j, probability in self.model.outcomes[i][policy[i]]:
+                rows.append(i)
+                columns.append(j)
+                probabilities.append(probability)
+        return scipy.sparse.csr_matrix((probabilities, (rows, columns)), shape=(self.model.size(), self.model.size()))
+
+    """
+    Evaluate a policy: solve U = R + gamma * P U exactly, or approximate it with a few sweeps from the current utilities
+
+    @param self: the class itself
+    @param rewards: a vector of rewards over floors
+    @param utilities: a vector of the current utilities over floors
+    @param policy: a vector of action indices over floors
+    @return a tuple of (1) a vector of utilities over floors, and (2) total entropy of the last sweep (of the whole solve when exact)
+    """
+    def evaluate_policy(self, rewards, utilities, policy):
+        transitions = self.policy_transitions(policy)
+        if self.evaluation_sweeps == None:
+            self.backups += self.model.size()
+            if _SCIPY_ENABLED:
+                system = scipy.sparse.identity(self.model.size(), format="csc") - self.discount_factor * transitions.tocsc()
+                evaluated_utilities = scipy.sparse.linalg.spsolve(system, rewards)
+            else:
+                evaluated_utilities = numpy.linalg.solve(numpy.eye(self.model.size()) - self.discount_factor * transitions, rewards)
+            return (evaluated_utilities, numpy.abs(evaluated_utilities - utilities).sum())
+        total_entropy = None
+        for i in range(self.evaluation_sweeps):
+            evaluated_utilities = rewards + self.discount_factor * transitions.dot(utilities)
+            total_entropy = numpy.abs(evaluated_utilities - utilities).sum()
+            utilities = evaluated_utilities
+            self.backups += self.model.size()
+        return (utilities, total_entropy)
+
+    """
+    Alternate policy evaluation and greedy improvement until the policy is stable and the utilities converge
+
+    @param self: the class itself
+    @param rewards: a vector of rewards over floors
+    @param utilities: a vector of initial utilities over floors
+    @param early_stopping_point: the maximum number of policy improvements
+    @param stopping_rule: (optional) the StoppingRule consulted after each improvement backup; the default value is None (total entropy against the convergence tolerance)
+    @return a tuple of (1) utilities, (2) the number of policy improvements performed, and (3) total entropy of the last sweep
+    """
+    def solve(self, rewards, utilities, early_stopping_point, stopping_rule=None):
+        if stopping_rule == None:
+            stopping_rule = StoppingRule(self.discount_factor, self.convergence_tolerance)
+        self.backups = 0
+        policy = None
+        stopping_point, total_entropy = 0, None
+        for i in range(early_stopping_point):
+            stopping_point = i + 1
+            improved_policy, backed_up_utilities = self.improve_policy(rewards, utilities, policy)
+            stable = policy is not None and (improved_policy == policy).all()
+            policy = improved_policy
+            # the improvement backup is a value iteration sweep of its own
+            residuals = numpy.abs(backed_up_utilities - utilities)
+            total_entropy = residuals.sum()
+            if self.evaluation_sweeps == None and stable:
+                # an exact evaluation of a stable policy is already optimal
+                stopping_rule.residual = residuals.max()
+                stopping_rule.reason = STABLE_POLICY_STOPPING
+                break
+            utilities = backed_up_utilities
+            if stopping_rule.converged(total_entropy, residuals.max(), utilities):
+                break
+            utilities, total_entropy = self.evaluate_policy(rewards, utilities, policy)
+        return (utilities, stopping_point, total_entropy)
+
+class ModifiedPolicyIteration(PolicyIteration):
+
+    """
+    Contrustor: policy iteration whose evaluation step is a fixed number of sweeps
+
+    An evaluation sweep costs as many backups as a value iteration sweep, and convergence is only checked at the improvement backup,
+    so on the shipped layouts it needs more backups and more time per move than VectorizedValueIteration for every evaluation_sweeps.
+
+    @param self: the class itself
+    @param model: the compiled MDPModel of the maze
+    @param discount_factor: the discount factor gamma (range between 0.0 and 1.0) in the Bellman's equation
+    @param convergence_tolerance: the threshold on total entropy to decide whether the utilities converge
+    @param evaluation_sweeps: (optional) the number of sweeps that evaluate each policy; the default value is 5
+    @return None
+    """
+    def __init__(self, model, discount_factor, convergence_tolerance, evaluation_sweeps=None):
+        if evaluation_sweeps == None:
+            evaluation_sweeps = DEFAULT_EVALUATION_SWEEPS
+        PolicyIteration.__init__(self, model, discount_factor, convergence_tolerance, evaluation_sweeps=evaluation_sweeps)
+
+class LocalHorizonValueIteration:
+
+    """
+    Contrustor: bind the solver to a compiled model
+
+    Only floors closer than the horizon to Pacman are backed up; floors exactly on the horizon keep a heuristic utility,
+    the reward of a target discounted by their maze distance to the nearest target. The cost of a sweep depends on the
+    horizon, not on the size of the maze.
+
+    @param self: the class itself
+    @param model: the compiled MDPModel of the maze
+    @param discount_factor: the discount factor gamma (range between 0.0 and 1.0) in the Bellman's equation
+    @param convergence_tolerance: the threshold on total entropy to decide whether the utilities converge
+    @param horizon: the number of maze steps around Pacman that are backed up
+    @param maximum_horizon: (optional) the largest horizon an ambiguous decision may grow to; the default value is None (4 times the horizon)
+    @param ambiguity: (optional) the utility gap between the two best moves below which the horizon is doubled; the default value is 1.0
+    @return None
+    """
+    def __init__(self, model, discount_factor, convergence_tolerance, horizon, maximum_horizon=None, ambiguity=1.0):
+        if not _NUMPY_ENABLED:
+            raise Exception("Local-horizon value iteration requires NumPy")
+        if horizon < 2:
+            raise Exception("The horizon has to reach past Pacman's neighbors: " + str(horizon))
+        if maximum_horizon == None:
+            maximum_horizon = 4 * horizon
+        self.model = model
+        self.discount_factor = discount_factor
+        self.convergence_tolerance = convergence_tolerance
+        self.horizon = horizon
+        self.maximum_horizon = max(horizon, maximum_horizon)
+        self.ambiguity = ambiguity
+        self.allocations = 0
+        self.backups = 0
+        self.last_horizon = None
+
+    """
+    The heuristic utilities of floors on the horizon: the target reward discounted by the maze distance to the nearest target
+
+    @param self: the class itself
+    @param boundary: the indices of the floors on the horizon
+    @param rewards: a vector of rewards over the boundary floors
+    @param targets: the indices of the floors of targets
+    @param target_reward: the reward of a target
+    @return a vector of utilities over the boundary floors
+    """
+    def bootstrap(self, boundary, rewards, targets, target_reward):
+        if len(boundary) == 0 or len(targets) == 0:
+            return rewards
+        nearest = self.model.distances[numpy.ix_(boundary, targets)].min(axis=1).astype(float)
+        # a target on the horizon already carries its own reward
+        return rewards + numpy.where(nearest > 0, target_reward * self.discount_factor ** nearest, 0.0)
+
+    """
+    Use value iteration over the floors within the horizon of Pacman, doubling the horizon while the decision is ambiguous
+
+    @param self: the class itself
+    @param rewards: a dictionary that point from a location (key) to its reward (value)
+    @param utilities: a dictionary that point from a location (key) to its initial utility (value)
+    @param center: the index of Pacman's floor
+    @param candidates: the indices of the floors Pacman can move to, one per legal action
+    @param targets: the indices of the floors of targets
+    @param target_reward: the reward of a target
+    @param early_stopping_point: the maximum number of sweeps per horizon
+    @param stopping_rule: (optional) the StoppingRule consulted after each sweep, over the floors within the horizon; the default value is None (total entropy against the convergence tolerance)
+    @return a tuple of (1) the indices of the floors solved, (2) their utilities, (3) the number of sweeps of the last horizon, and (4) total entropy of the last sweep
+    """
+    def solve(self, rewards, utilities, center, candidates, targets, target_reward, early_stopping_point, stopping_rule=None):
+        if stopping_rule == None:
+            stopping_rule = StoppingRule(self.discount_factor, self.convergence_tolerance)
+        self.backups = 0
+        horizon = self.horizon
+        while True:
+            interior, boundary = self.model.region(center, horizon)
+            region = interior + boundary
+            position = dict([(region[k], k) for k in range(len(region))])
+            # the transitions out of the interior never leave the region
+            transitions = numpy.zeros((len(ACTIONS), len(interior), len(region)))
+            for row in range(len(interior)):
+                for a in range(len(ACTIONS)):
+                    for j, probability in self.model.outcomes[interior[row]][a]:
+                        transitions[a, row, position[j]] += probability
+            transitions = transitions.reshape(len(ACTIONS) * len(interior), len(region))
+            local_rewards = self.model.vectorize(rewards, region)
+            current = self.model.vectorize(utilities, region)
+            current[len(interior):] = self.bootstrap(boundary, local_rewards[len(interior):], targets, target_reward)
+            local_candidates = [position[candidate] for candidate in candidates]
+            stopping_rule.reset(local_candidates)
+            stopping_point, total_entropy = 0, None
+            for i in range(early_stopping_point):
+                stopping_point = i + 1
+                updated_utilities = local_rewards[:len(interior)] + self.discount_factor * transitions.dot(current).reshape(len(ACTIONS), len(interior)).max(axis=0)
+                residuals = numpy.abs(updated_utilities - current[:len(interior)])
+                total_entropy = residuals.sum()
+                current[:len(interior)] = updated_utilities
+                self.backups += len(interior)
+                if stopping_rule.converged(total_entropy, residuals.max(), current):
+                    break
+            # a clear decision, the whole reachable maze, or the largest horizon allowed ends the search
+            gap = None
+            if len(local_candidates) > 1:
+                best = sorted([current[candidate] for candidate in local_candidates], reverse=True)
+                gap = best[0] - best[1]
+            if gap == None or gap >= self.ambiguity or len(boundary) == 0 or horizon >= self.maximum_horizon:
+                break
+            horizon = min(2 * horizon, self.maximum_horizon)
+        self.last_horizon = horizon
+        return (region, current, stopping_point, total_entropy)
+
+# compiled models shared by every round and game in this process, keyed by layoutKey
+MODEL_CACHE = {}
+
+# bumped whenever the compiled model changes, so that models stored by an older version are not reused
+MODEL_VERSION = 2
+
+"""
+Hash the text of a layout into the key of its compiled model
+
+@param layout_text: the list of strings of Layout.layoutText
+@return a hexadecimal digest
+"""
+def layoutKey(layout_text):
+    return hashlib.sha1("\n".join(layout_text) + "\n" + str(MODEL_VERSION)).hexdigest()
+
+"""
+Fetch the compiled model of a layout: from memory, then from the on-disk store, compiling it only on a miss (or a corrupt file)
+
+@param layout_text: the list of strings of Layout.layoutText
+@param wall_grid: the Grid of walls of the layout, only read on a miss
+@param cache_dir: (optional) a directory holding compiled models as <key>.npz files; the default value is None (memory only)
+@return the MDPModel of the layout
+"""
+def getModel(layout_text, wall_grid, cache_dir=None):
+    key = layoutKey(layout_text)
+    if key in MODEL_CACHE:
+        return MODEL_CACHE[key]
+    model = None
+    path = None
+    if cache_dir != None and _NUMPY_ENABLED:
+        path = os.path.join(cache_dir, key + ".npz")
+        if os.path.exists(path):
+            try:
+                model = loadModel(path)
+            except (IOError, OSError, EOFError, ValueError, KeyError, zipfile.BadZipfile, zlib.error):
+                # an unreadable or corrupt file is a miss; it is compiled and written again
+                model = None
+    if model == None:
+        model = MDPModel(wall_grid.asList())
+        if path != None:
+            saveModel(model, path)
+    MODEL_CACHE[key] = model
+    return model
+
+"""
+Write a compiled model to disk
+
+@param model: the MDPModel to store
+@param path: the .npz file to write
+@return None
+"""
+def saveModel(model, path):
+    directory = os.path.dirname(path)
+    if directory != "" and not os.path.isdir(directory):
+        os.makedirs(directory)
+    # written to a temporary file first, so that a worker sharing the directory never reads half a file;
+    # a directory that cannot be written simply keeps no models
+    temporary = "%s.%d.tmp" % (path, os.getpid())
+    try:
+        f = open(temporary, "wb")
+        try:
+            numpy.savez_compressed(f, walls=numpy.array(model.walls, dtype=int), floors=numpy.array(model.floors, dtype=int), transitions=model.transitions, distances=model.distances)
+        finally:
+            f.close()
+        os.rename(temporary, path)
+    except (IOError, OSError):
+        if os.path.exists(temporary):
+            os.remove(temporary)
+
+"""
+Read a compiled model from disk
+
+@param path: the .npz file written by saveModel
+@return the MDPModel; an unreadable or inconsistent file raises IOError, ValueError or a zip/zlib error
+"""
+def loadModel(path):
+    # a file that is not a zip archive at all is rejected before NumPy opens it
+    zipfile.ZipFile(path).close()
+    data = numpy.load(path)
+    try:
+        walls = [(int(x), int(y)) for x, y in data["walls"]]
+        floors = [(int(x), int(y)) for x, y in data["floors"]]
+        transitions, distances = data["transitions"], data["distances"]
+    finally:
+        data.close()
+    if transitions.shape != (len(ACTIONS), len(floors), len(floors)) or distances.shape != (len(floors), len(floors)):
+        raise ValueError("The compiled model in " + path + " does not match its floors")
+    return MDPModel(walls, floors=floors, transitions=transitions, distances=distances)
+
+# solvers selectable through the agent argument solver=...; "classic" is the dictionary solver inside MDPAgent
+CLASSIC_SOLVER = "classic"
+SOLVERS = {"vectorized": VectorizedValueIteration, "prioritized": PrioritizedSweeping, "policy_iteration": PolicyIteration, "modified_policy_iteration": ModifiedPolicyIteration}
+DEFAULT_SOLVER = "vectorized" if _NUMPY_ENABLED else CLASSIC_SOLVER
+# the solvers that sweep every floor and can do it in place; the others reject update_mode=gauss_seidel
+UPDATE_MODE_SOLVERS = [CLASSIC_SOLVER, "vectorized"]
+
+"""
+Create a solver by name
+
+@param name: a key of SOLVERS
+@param model: the compiled MDPModel of the maze
+@param discount_factor: the discount factor gamma (range between 0.0 and 1.0) in the Bellman's equation
+@param convergence_tolerance: the threshold on total entropy to decide whether the utilities converge
+@param update_mode: (optional) how each sweep keeps the previous iterate, for the solvers in UPDATE_MODE_SOLVERS; the default value is double_buffer
+@param evaluation_sweeps: (optional) the number of sweeps that evaluate each policy, for the policy iteration solvers; the default value is None
+@return the solver
+"""
+def getSolver(name, model, discount_factor, convergence_tolerance, update_mode=DOUBLE_BUFFER_MODE, evaluation_sweeps=None):
+    if name not in SOLVERS:
+        raise Exception("Unknown MDP solver: " + str(name))
+    if update_mode != DOUBLE_BUFFER_MODE and name not in UPDATE_MODE_SOLVERS:
+        raise Exception("The " + name + " solver has no update modes: " + str(update_mode))
+    if issubclass(SOLVERS[name], PolicyIteration):
+        return SOLVERS[name](model, discount_factor, convergence_tolerance, evaluation_sweeps=evaluation_sweeps)
+    if name in UPDATE_MODE_SOLVERS:
+        return SOLVERS[name](model, discount_factor, convergence_tolerance, update_mode=update_mode)
+    return SOLVERS[name](model, discount_factor, convergence_tolerance)
@@ -43,6 +43,7 @@ from game import GameStateData
 from game import Game
 from game import Directions
 from game import Actions
+from game import Configuration
 from util import nearestPoint
 from util import manhattanDistance
 import util, layout
@@ -71,9 +72,23 @@ class GameState:
     # Accessor methods: use these to access state data #
     ####################################################
 
-    # static variable keeps track of which states have had getLegalActions called
-    explored = set()
+    # static variable keeps track of which states have had successors generated;
+    # it is None (and nothing is tracked) until trackExplored() is called
+    explored = None
+    def trackExplored( enabled=True ):
+        """
+        Turns the tracking of explored states on (with an empty set) or off.
+        Tracking hashes every parent and successor state, so it is meant for
+        autograder-style instrumentation rather than normal simulation.
+        """
+        if enabled:
+            GameState.explored = set()
+        else:
+            GameState.explored = None
+    trackExplored = staticmethod(trackExplored)
+
     def getAndResetExplored():
+        if GameState.explored == None: return set()
         tmp = GameState.explored.copy()
         GameState.explored = set()
         return tmp
@@ -112,7 +127,7 @@ class GameState:
         if agentIndex == 0:
             state.data.scoreChange += -TIME_PENALTY # Penalty for waiting around
         else:
-            GhostRules.decrementTimer( state.data.agentStates[agentIndex] )
+            GhostRules.decrementTimer( state.data.ownAgentState( agentIndex ) )
 
         # Resolve multi-agent effects
         GhostRules.checkDeath( state, agentIndex )
@@ -120,8 +135,9 @@ class GameState:
         # Book keeping
         state.data._agentMoved = agentIndex
         state.data.score += state.data.scoreChange
-        GameState.explored.add(self)
-        GameState.explored.add(state)
+        if GameState.explored != None:
+            GameState.explored.add(self)
+            GameState.explored.add(state)
         return state
 
     def getLegalPacmanActions( self ):
@@ -174,7 +190,10 @@ class GameState:
         return self.data.capsules
 
     def getNumFood( self ):
-        return self.data.food.count()
+        return self.data.numFood
+
+    def getNumCapsules( self ):
+        return self.data.numCapsules
 
     def getFood(self):
         """
@@ -201,10 +220,10 @@ class GameState:
         return self.data.layout.walls
 
     def hasFood(self, x, y):
-        return self.data.food[x][y]
+        return self.data.food.get(x, y)
 
     def hasWall(self, x, y):
-        return self.data.layout.walls[x][y]
+        return self.data.layout.walls.get(x, y)
 
     def isLose( self ):
         return self.data._lose
@@ -231,6 +250,12 @@ class GameState:
         state.data = self.data.deepCopy()
         return state
 
+    def copyOnWrite( self ):
+        "A cheap copy that agents may generate successors of (see GameStateData.copyOnWrite)."
+        state = GameState()
+        state.data = self.data.copyOnWrite()
+        return state
+
     def __eq__( self, other ):
         """
         Allows two states to be compared.
@@ -268,14 +293,16 @@ class ClassicGameRules:
     These game rules manage the control flow of a game, deciding when
     and how the game starts and ends.
     """
-    def __init__(self, timeout=30):
+    def __init__(self, timeout=30, moveTimeout=None):
         self.timeout = timeout
+        # the per-move limit in milliseconds; None leaves it at timeout
+        self.moveTimeout = moveTimeout
 
-    def newGame( self, layout, pacmanAgent, ghostAgents, display, quiet = False, catchExceptions=False):
+    def newGame( self, layout, pacmanAgent, ghostAgents, display, quiet = False, catchExceptions=False, fastMode=False):
         agents = [pacmanAgent] + ghostAgents[:layout.getNumGhosts()]
         initState = GameState()
         initState.initialize( layout, len(ghostAgents) )
-        game = Game(agents, display, self, catchExceptions=catchExceptions)
+        game = Game(agents, display, self, catchExceptions=catchExceptions, fastMode=fastMode)
         game.state = initState
         self.initialState = initState.deepCopy()
         self.quiet = quiet
@@ -312,9 +339,10 @@ class ClassicGameRules:
         return self.timeout
 
     def getMoveWarningTime(self, agentIndex):
-        return self.timeout
+        return self.getMoveTimeout(agentIndex)
 
     def getMoveTimeout(self, agentIndex):
+        if self.moveTimeout != None: return self.moveTimeout / 1000.0
         return self.timeout
 
     def getMaxTimeWarnings(self, agentIndex):
@@ -331,7 +359,11 @@ class PacmanRules:
         """
         Returns a list of possible actions.
         """
-        return Actions.getPossibleActions( state.getPacmanState().configuration, state.data.layout.walls )
+        conf = state.getPacmanState().configuration
+        possibleActions = state.data.layout.getActionTables()[0].get( conf.pos )
+        if possibleActions == None: # between two cells
+            return Actions.getPossibleActions( conf, state.data.layout.walls )
+        return possibleActions[:]
     getLegalActions = staticmethod( getLegalActions )
 
     def applyAction( state, action ):
@@ -342,7 +374,7 @@ class PacmanRules:
         if action not in legal:
             raise Exception("Illegal action " + str(action))
 
-        pacmanState = state.data.agentStates[0]
+        pacmanState = state.data.ownAgentState( 0 )
 
         # Update Configuration
         vector = Actions.directionToVector( action, PacmanRules.PACMAN_SPEED )
@@ -359,23 +391,21 @@ class PacmanRules:
     def consume( position, state ):
         x,y = position
         # Eat food
-        if state.data.food[x][y]:
+        if state.data.food.get(x, y):
             state.data.scoreChange += 10
-            state.data.food = state.data.food.copy()
-            state.data.food[x][y] = False
+            state.data.eatFood( x, y )
             state.data._foodEaten = position
-            # TODO: cache numFood?
             numFood = state.getNumFood()
             if numFood == 0 and not state.data._lose:
                 state.data.scoreChange += 500
                 state.data._win = True
         # Eat capsule
         if( position in state.getCapsules() ):
-            state.data.capsules.remove( position )
+            state.data.eatCapsule( position )
             state.data._capsuleEaten = position
             # Reset all ghosts' scared timers
             for index in range( 1, len( state.data.agentStates ) ):
-                state.data.agentStates[index].scaredTimer = SCARED_TIME
+                state.data.ownAgentState( index ).scaredTimer = SCARED_TIME
     consume = staticmethod( consume )
 
 class GhostRules:
@@ -389,6 +419,10 @@ class GhostRules:
         reach a dead end, but can turn 90 degrees at intersections.
         """
         conf = state.getGhostState( ghostIndex ).configuration
+        legalActions = state.data.layout.getActionTables()[1].get( ( conf.pos, conf.direction ) )
+        if legalActions != None:
+            return legalActions[:]
+        # Scared ghosts can stand between two cells
         possibleActions = Actions.getPossibleActions( conf, state.data.layout.walls )
         reverse = Actions.reverseDirection( conf.direction )
         if Directions.STOP in possibleActions:
@@ -404,7 +438,7 @@ class GhostRules:
         if action not in legal:
             raise Exception("Illegal ghost action " + str(action))
 
-        ghostState = state.data.agentStates[ghostIndex]
+        ghostState = state.data.ownAgentState( ghostIndex )
         speed = GhostRules.GHOST_SPEED
         if ghostState.scaredTimer > 0: speed /= 2.0
         vector = Actions.directionToVector( action, speed )
@@ -414,7 +448,9 @@ class GhostRules:
     def decrementTimer( ghostState):
         timer = ghostState.scaredTimer
         if timer == 1:
-            ghostState.configuration.pos = nearestPoint( ghostState.configuration.pos )
+            # A new Configuration: the old one is shared with the predecessor
+            configuration = ghostState.configuration
+            ghostState.configuration = Configuration( nearestPoint( configuration.pos ), configuration.direction )
         ghostState.scaredTimer = max( 0, timer - 1 )
     decrementTimer = staticmethod( decrementTimer )
 
@@ -435,6 +471,7 @@ class GhostRules:
 
     def collide( state, ghostState, agentIndex):
         if ghostState.scaredTimer > 0:
+            ghostState = state.data.ownAgentState( agentIndex )
             state.data.scoreChange += 200
             GhostRules.placeGhost(state, ghostState)
             ghostState.scaredTimer = 0
@@ -523,12 +560,23 @@ def readCommand( argv ):
                       help='Turns on exception handling and timeouts during games', default=False)
     parser.add_option('--timeout', dest='timeout', type='int',
                       help=default('Maximum length of time an agent can spend computing in a single game'), default=30)
+    parser.add_option('--moveTimeout', dest='moveTimeout', type='int',
+                      help='Maximum length of time in milliseconds an agent can spend on a single move [Default: the game timeout]', default=None)
+    parser.add_option('--fast', action='store_true', dest='fastMode',
+                      help='Trusted agents: hand them copy-on-write states instead of deep copies, never mute or time agents', default=False)
+    parser.add_option('--checkCounts', action='store_true', dest='checkCounts',
+                      help='Recounts the food and capsules after every change to check the cached counters', default=False)
 
     options, otherjunk = parser.parse_args(argv)
     if len(otherjunk) != 0:
         raise Exception('Command line input not understood: ' + str(otherjunk))
     args = dict()
 
+    # Debug mode: check the cached food and capsule counters
+    if options.checkCounts:
+        import game
+        game.CHECK_COUNTS = True
+
     # Fix the random seed
     if options.fixRandomSeed: random.seed('cs188')
 
@@ -570,6 +618,8 @@ def readCommand( argv ):
     args['record'] = options.record
     args['catchExceptions'] = options.catchExceptions
     args['timeout'] = options.timeout
+    args['moveTimeout'] = options.moveTimeout
+    args['fastMode'] = options.fastMode
 
     # Special case: recorded games don't use the runGames method or args structure
     if options.gameToReplay != None:
@@ -625,11 +675,11 @@ def replayGame( layout, actions, display ):
 
     display.finish()
 
-def runGames( layout, pacman, ghosts, display, numGames, record, numTraining = 0, catchExceptions=False, timeout=30 ):
+def runGames( layout, pacman, ghosts, display, numGames, record, numTraining = 0, catchExceptions=False, timeout=30, fastMode=False, moveTimeout=None ):
     import __main__
     __main__.__dict__['_display'] = display
 
-    rules = ClassicGameRules(timeout)
+    rules = ClassicGameRules(timeout, moveTimeout)
     games = []
 
     for i in range( numGames ):
@@ -642,7 +692,7 @@ def runGames( layout, pacman, ghosts, display, numGames, record, numTraining = 0
         else:
             gameDisplay = display
             rules.quiet = False
-        game = rules.newGame( layout, pacman, ghosts, gameDisplay, beQuiet, catchExceptions)
+        game = rules.newGame( layout, pacman, ghosts, gameDisplay, beQuiet, catchExceptions, fastMode)
         game.run()
         if not beQuiet: games.append(game)
 
@@ -657,14 +707,18 @@ def runGames( layout, pacman, ghosts, display, numGames, record, numTraining = 0
     if (numGames-numTraining) > 0:
         scores = [game.state.getScore() for game in games]
         wins = [game.state.isWin() for game in games]
-        winRate = wins.count(True)/ float(len(wins))
-        print 'Average Score:', sum(scores) / float(len(scores))
-        print 'Scores:       ', ', '.join([str(score) for score in scores])
-        print 'Win Rate:      %d/%d (%.2f)' % (wins.count(True), len(wins), winRate)
-        print 'Record:       ', ', '.join([ ['Loss', 'Win'][int(w)] for w in wins])
+        printSummary(scores, wins)
 
     return games
 
+def printSummary( scores, wins ):
+    "Prints the average score, scores, win rate and record of a list of games."
+    winRate = wins.count(True)/ float(len(wins))
+    print 'Average Score:', sum(scores) / float(len(scores))
+    print 'Scores:       ', ', '.join([str(score) for score in scores])
+    print 'Win Rate:      %d/%d (%.2f)' % (wins.count(True), len(wins), winRate)
+    print 'Record:       ', ', '.join([ ['Loss', 'Win'][int(w)] for w in wins])
+
 if __name__ == '__main__':
     """
     The main function called when pacman.py is run
@@ -0,0 +1,145 @@
+# pacmanEnvironment.py
+# --------------------
+# A reset/step environment over the game engine, for learning agents.
+#
+# A PacmanEnvironment plays classic games with GameState and the ghost
+# agents directly: there is no Game object, no display, no state copies,
+# no muting and no timeouts. Pacman's action is passed to step(), which
+# then lets every ghost reply and returns (observation, reward, done,
+# info), the reward being the change of score:
+#
+#   environment = PacmanEnvironment('mediumClassic')
+#   observation = environment.reset(seed=7)
+#   done = False
+#   while not done:
+#       action = random.choice(environment.legalActions())
+#       observation, reward, done, info = environment.step(action)
+#
+# Observations are the GameState itself, or a compact array when an
+# ObservationEncoder is given.
+
+import binascii
+import random
+
+from ghostAgents import RandomGhost
+from vectorEnvironment import ACTIONS
+import layout
+import pacman
+
+try:
+    import numpy
+    _NUMPY_ENABLED = True
+except:
+    _NUMPY_ENABLED = False
+
+class ObservationEncoder:
+    """
+    Encodes a GameState as a (6, width, height) uint8 array with one plane
+    per kind of object: walls, food, capsules, Pacman, ghosts and scared
+    ghosts. The scared ghosts plane holds the scared timers; ghosts between
+    two cells are put on the nearest one.
+    """
+    WALLS, FOOD, CAPSULES, PACMAN, GHOSTS, SCARED_GHOSTS = range(6)
+    NUM_PLANES = 6
+
+    def __init__(self):
+        if not _NUMPY_ENABLED:
+            raise Exception('ObservationEncoder needs NumPy')
+        self.walls = {}
+
+    def encode(self, state):
+        board = state.data.layout
+        observation = numpy.zeros((self.NUM_PLANES, board.width, board.height), dtype=numpy.uint8)
+        if board not in self.walls:
+            self.walls[board] = unpackGrid(board.walls)
+        observation[self.WALLS] = self.walls[board]
+        observation[self.FOOD] = unpackGrid(state.getFood())
+        for x, y in state.getCapsules():
+            observation[self.CAPSULES, x, y] = 1
+        x, y = state.getPacmanPosition()
+        observation[self.PACMAN, int(x), int(y)] = 1
+        for ghostState in state.getGhostStates():
+            x, y = ghostState.getPosition()
+            x, y = int(x + 0.5), int(y + 0.5)
+            if ghostState.scaredTimer > 0:
+                observation[self.SCARED_GHOSTS, x, y] = ghostState.scaredTimer
+            else:
+                observation[self.GHOSTS, x, y] = 1
+        return observation
+
+def unpackGrid(grid):
+    "A (width, height) uint8 array of a Grid, unpacked from the bitboard of a BitGrid."
+    if not hasattr(grid, 'bits'):
+        return numpy.array(grid.data, dtype=numpy.uint8)
+    cells = grid.width * grid.height
+    numBytes = (cells + 7) / 8
+    packed = numpy.frombuffer(binascii.unhexlify('%0*x' % (2 * numBytes, grid.bits)), dtype=numpy.uint8)
+    return numpy.unpackbits(packed)[::-1][:cells].reshape((grid.width, grid.height))
+
+class PacmanEnvironment:
+    """
+    Classic games of a layout played one step at a time: step(action) moves
+    Pacman and then each ghost agent, ending the game on a win or a loss as
+    ClassicGameRules does. Actions are directions or indices into
+    vectorEnvironment.ACTIONS.
+    """
+    def __init__(self, board='mediumClassic', ghostType=RandomGhost, numGhosts=4, encoder=None):
+        if type(ghostType) == str:
+            ghostType = pacman.loadAgent(ghostType, True)
+        self.ghostType = ghostType
+        self.numGhosts = numGhosts
+        self.encoder = encoder
+        self.layout = None
+        self.state = None
+        self.setLayout(board)
+
+    def setLayout(self, board):
+        if type(board) == str:
+            name = board
+            board = layout.getLayout(name)
+            if board == None: raise Exception("The layout " + name + " cannot be found")
+        if board is not self.layout:
+            self.layout = board
+            self.ghosts = [self.ghostType(i + 1) for i in range(min(self.numGhosts, board.getNumGhosts()))]
+
+    def reset(self, board=None, seed=None):
+        """
+        Starts a new game, on board (a Layout or a layout name) if given, and
+        seeds the random module the ghosts draw from if seed is given.
+        Returns the first observation.
+        """
+        if board != None: self.setLayout(board)
+        if seed != None: random.seed(seed)
+        self.state = pacman.GameState()
+        self.state.initialize(self.layout, len(self.ghosts))
+        self.moves = 0
+        return self.observe()
+
+    def observe(self):
+        if self.encoder == None: return self.state
+        return self.encoder.encode(self.state)
+
+    def legalActions(self):
+        "Pacman's legal directions."
+        return self.state.getLegalActions(0)
+
+    def step(self, action):
+        """
+        Moves Pacman, then every ghost until the game is over. Returns
+        (observation, reward, done, info) where the reward is the change of
+        score and info holds the score, win, lose and the number of moves.
+        """
+        if self.state == None: raise Exception('Call reset() before step()')
+        state = self.state
+        if state.isWin() or state.isLose(): raise Exception('The game is over; call reset()')
+        if type(action) != str: action = ACTIONS[action]
+        score = state.getScore()
+        state = state.generateSuccessor(0, action)
+        for ghost in self.ghosts:
+            if state.isWin() or state.isLose(): break
+            state = state.generateSuccessor(ghost.index, ghost.getAction(state))
+        self.state = state
+        self.moves += 1
+        done = state.isWin() or state.isLose()
+        info = {'score': state.getScore(), 'win': state.isWin(), 'lose': state.isLose(), 'moves': self.moves}
+        return self.observe(), state.getScore() - score, done, info
@@ -0,0 +1,258 @@
+# sweep.py
+# --------
+# Hyper-parameter sweeps of MDPAgent.
+#
+# A sweep plays every configuration of a search space on the same game
+# seeds, in rounds of --batch games. The games of every configuration in a
+# round share one process pool that lives as long as the sweep (see
+# batchRunner.py). After each round, configurations whose confidence
+# interval lies entirely below the one of the best configuration are
+# pruned. Every finished game is appended to a checkpoint file, so an
+# interrupted sweep resumes where it stopped when run again.
+#
+#   python sweep.py -l mediumClassic -n 200 --checkpoint sweep.jsonl \
+#       --space "discount_factor=0.6,0.7,0.8;safety_distance=2,3,4;ghostbuster_mode=inactive,offensive"
+#
+#   python sweep.py --search random --samples 30 \
+#       --space "discount_factor=0.5:0.95;threat_decay_rate=25:100;safety_distance=1:5"
+#
+# In a random search a value list is sampled uniformly, and low:high a
+# uniform range (of integers when both ends are integers).
+
+import json
+import math
+import os
+import random
+import sys
+
+import batchRunner
+import pacman
+
+# the space of test_cases/test_case_generator.py
+DEFAULT_SPACE = 'discount_factor=1.0,0.9,0.8,0.7,0.6;safety_distance=4,3,2,1;ghostbuster_mode=inactive,defensive,offensive'
+
+# two-sided normal quantiles of the supported confidence levels
+Z_SCORES = {0.8: 1.282, 0.9: 1.645, 0.95: 1.96, 0.99: 2.576}
+
+def parseSpace(text):
+    """
+    Parses "name=v1,v2;name=low:high" into a dictionary from a parameter
+    name to either a list of values or a (low, high) range.
+    """
+    space = {}
+    for part in text.split(';'):
+        if part.strip() == '': continue
+        name, values = part.split('=')
+        if ':' in values:
+            low, high = values.split(':')
+            space[name.strip()] = (parseValue(low), parseValue(high))
+        else:
+            space[name.strip()] = [parseValue(value) for value in values.split(',')]
+    return space
+
+def parseValue(text):
+    "Reads an integer, a float or a string."
+    text = text.strip()
+    for kind in [int, float]:
+        try:
+            return kind(text)
+        except ValueError:
+            pass
+    return text
+
+def gridConfigurations(space):
+    "Every combination of the listed values, in a fixed order."
+    configurations = [{}]
+    for name in sorted(space.keys()):
+        if type(space[name]) == tuple:
+            raise Exception('A grid search needs a list of values for ' + name)
+        configurations = [dict(configuration.items() + [(name, value)]) for configuration in configurations for value in space[name]]
+    return configurations
+
+def randomConfigurations(space, samples, seed):
+    "samples configurations drawn from the space; the same seed draws the same ones."
+    generator = random.Random(seed)
+    configurations = []
+    for i in range(samples):
+        configuration = {}
+        for name in sorted(space.keys()):
+            values = space[name]
+            if type(values) != tuple:
+                configuration[name] = generator.choice(values)
+            elif type(values[0]) == int and type(values[1]) == int:
+                configuration[name] = generator.randint(values[0], values[1])
+            else:
+                configuration[name] = round(generator.uniform(values[0], values[1]), 3)
+        configurations.append(configuration)
+    return configurations
+
+def agentArgs(configuration, fixedArgs=None):
+    "The -a string of a configuration, which also identifies it in the checkpoint."
+    pieces = ['%s=%s' % (name, configuration[name]) for name in sorted(configuration.keys())]
+    if fixedArgs: pieces.append(fixedArgs)
+    return ','.join(pieces)
+
+def loadCheckpoint(path):
+    "Maps the agent arguments of every configuration to {game index: record} of its finished games."
+    games = {}
+    if path == None or not os.path.exists(path):
+        return games
+    with open(path) as checkpoint:
+        for line in checkpoint:
+            if line.strip() == '': continue
+            record = json.loads(line)
+            games.setdefault(record['args'], {})[record['game']] = record
+    return games
+
+def interval(values, z):
+    "The mean of the values and the half-width of its normal confidence interval."
+    n = len(values)
+    mean = sum(values) / float(n)
+    if n < 2:
+        return mean, float('inf')
+    variance = sum([(value - mean) ** 2 for value in values]) / float(n - 1)
+    return mean, z * math.sqrt(variance / n)
+
+def metricValues(records, metric, numGames):
+    "The scores (or wins, as 0/1) of the first numGames games of a configuration."
+    values = []
+    for index in range(numGames):
+        if index in records:
+            values.append(float(records[index][metric]))
+    return values
+
+def prune(active, games, metric, numGames, z):
+    """
+    Returns the configurations in active whose interval over the first
+    numGames games does not lie entirely below the best lower bound.
+    """
+    intervals = {}
+    for args in active:
+        intervals[args] = interval(metricValues(games.get(args, {}), metric, numGames), z)
+    bestLower = max([mean - width for mean, width in intervals.values()])
+    return [args for args in active if intervals[args][0] + intervals[args][1] >= bestLower]
+
+def runSweep(configurations, spec, numGames, batch, seed, workers, checkpointPath, metric='score', confidence=0.95, pruning=True):
+    """
+    Plays every configuration on game seeds 0..numGames-1 of the master seed,
+    batch games at a time, pruning dominated configurations after each round.
+    Returns (configurations, games, pruned): the games as loaded/played and
+    the round (number of games) at which each pruned configuration stopped.
+    """
+    z = Z_SCORES[confidence]
+    games = loadCheckpoint(checkpointPath)
+    order = [agentArgs(configuration, spec['agentArgs']) for configuration in configurations]
+    specs = dict([(args, dict(spec.items() + [('agentArgs', args)])) for args in order])
+    seeds = batchRunner.gameSeeds(seed, numGames)
+    active = list(order)
+    pruned = {}
+    checkpoint = None
+    if checkpointPath != None:
+        checkpoint = open(checkpointPath, 'a')
+    # one pool for the whole sweep: every worker keeps the agents of the configurations it has played
+    pool = batchRunner.createPool(workers, len(order) * numGames)
+    try:
+        played = 0
+        while played < numGames and len(active) > 0:
+            target = min(numGames, played + batch)
+            # the missing games of every active configuration, played as one round
+            tasks = []
+            for args in active:
+                records = games.setdefault(args, {})
+                tasks += [(args, specs[args], index, seeds[index]) for index in range(played, target) if index not in records]
+            for args, result in batchRunner.playTasks(pool, batchRunner.playLabelledGame, tasks):
+                index, gameSeed, score, win, moves, seconds = result
+                record = {'args': args, 'game': index, 'seed': gameSeed, 'score': score, 'win': int(win), 'moves': moves}
+                games[args][index] = record
+                if checkpoint != None:
+                    checkpoint.write(json.dumps(record, sort_keys=True) + '\n')
+                    checkpoint.flush()
+            played = target
+            if pruning and len(active) > 1:
+                survivors = prune(active, games, metric, played, z)
+                for args in active:
+                    if args not in survivors: pruned[args] = played
+                active = survivors
+            print 'Round of %d games done: %d/%d configurations left' % (played, len(active), len(order))
+            sys.stdout.flush()
+    except:
+        if pool != None: pool.terminate()
+        raise
+    finally:
+        if checkpoint != None: checkpoint.close()
+    if pool != None:
+        pool.close()
+        pool.join()
+    return order, games, pruned
+
+def printTable(configurations, games, pruned, metric, numGames, confidence):
+    "Prints one row per configuration, the best mean first."
+    z = Z_SCORES[confidence]
+    rows = []
+    for args in configurations:
+        records = games.get(args, {})
+        played = numGames
+        if args in pruned: played = pruned[args]
+        scores = metricValues(records, 'score', played)
+        wins = metricValues(records, 'win', played)
+        if len(scores) == 0: continue
+        mean, width = interval(metricValues(records, metric, played), z)
+        rows.append((mean, args, len(scores), sum(scores) / len(scores), sum(wins) / len(wins), width))
+    rows.sort(reverse=True)
+    print '%-70s %6s %10s %8s %12s %8s' % ('configuration', 'games', 'score', 'win rate', '%d%% CI' % int(100 * confidence), 'status')
+    for mean, args, played, score, winRate, width in rows:
+        status = 'complete'
+        if args in pruned: status = 'pruned'
+        print '%-70s %6d %10.1f %8.2f %12s %8s' % (args, played, score, winRate, '+/- %.1f' % width, status)
+
+def readCommand(argv):
+    from optparse import OptionParser
+    parser = OptionParser('USAGE: python sweep.py <options>')
+    parser.add_option('--space', dest='space',
+                      help=pacman.default('the search space, "name=v1,v2;name=low:high"'), default=DEFAULT_SPACE)
+    parser.add_option('--search', dest='search', type='choice', choices=['grid', 'random'],
+                      help=pacman.default('grid or random search'), default='grid')
+    parser.add_option('--samples', dest='samples', type='int',
+                      help=pacman.default('the number of configurations of a random search'), default=20)
+    parser.add_option('-n', '--numGames', dest='numGames', type='int',
+                      help=pacman.default('the number of games per configuration'), default=100)
+    parser.add_option('-b', '--batch', dest='batch', type='int',
+                      help=pacman.default('the number of games per configuration between two pruning decisions'), default=20)
+    parser.add_option('-l', '--layout', dest='layout',
+                      help=pacman.default('the LAYOUT_FILE from which to load the map layout'), default='mediumClassic')
+    parser.add_option('-p', '--pacman', dest='pacman',
+                      help=pacman.default('the agent TYPE to sweep'), default='MDPAgent')
+    parser.add_option('-a', '--agentArgs', dest='agentArgs',
+                      help='Comma separated values sent to every configuration of the agent', default=None)
+    parser.add_option('-k', '--numghosts', type='int', dest='numGhosts',
+                      help=pacman.default('The maximum number of ghosts to use'), default=4)
+    parser.add_option('-s', '--seed', dest='seed', type='int',
+                      help=pacman.default('the master seed of the games and of a random search'), default=0)
+    parser.add_option('-w', '--workers', dest='workers', type='int',
+                      help='the number of worker processes [Default: one per CPU]', default=None)
+    parser.add_option('--checkpoint', dest='checkpoint',
+                      help='a file every finished game is appended to, and resumed from', default=None)
+    parser.add_option('--metric', dest='metric', type='choice', choices=['score', 'win'],
+                      help=pacman.default('what pruning and the table rank by: score or win'), default='score')
+    parser.add_option('--confidence', dest='confidence', type='float',
+                      help=pacman.default('the confidence level of the intervals (0.8, 0.9, 0.95 or 0.99)'), default=0.95)
+    parser.add_option('--noPruning', action='store_false', dest='pruning',
+                      help='play every configuration to the end', default=True)
+    options, otherjunk = parser.parse_args(argv)
+    if len(otherjunk) != 0:
+        raise Exception('Command line input not understood: ' + str(otherjunk))
+    if options.confidence not in Z_SCORES:
+        raise Exception('Unsupported confidence level: ' + str(options.confidence))
+    return options
+
+if __name__ == '__main__':
+    options = readCommand(sys.argv[1:])
+    space = parseSpace(options.space)
+    if options.search == 'grid':
+        configurations = gridConfigurations(space)
+    else:
+        configurations = randomConfigurations(space, options.samples, options.seed)
+    spec = batchRunner.gameSpec(options.layout, options.pacman, options.agentArgs, numGhosts=options.numGhosts)
+    order, games, pruned = runSweep(configurations, spec, options.numGames, options.batch, options.seed, options.workers,
+                                    options.checkpoint, options.metric, options.confidence, options.pruning)
+    printTable(order, games, pruned, options.metric, options.numGames, options.confidence)
@@ -643,6 +643,297 @@ class TimeoutFunction:
         return result
 
 
+# time budgets
+#
+# A TimeBudget times an agent on a monotonic clock in fractions of a
+# second: a deadline for the running move and a total for the game. It
+# needs no signals, so games may be timed in any thread or process, and
+# anytime agents can poll timeRemaining() to stop a computation in time.
+# Overruns are caught in two ways: every call is timed again when it
+# returns, and a single watchdog thread raises TimeoutFunctionException
+# in a thread whose call is still running past its deadline.
+#
+# The watchdog interrupts like SIGALRM did: between any two bytecodes of
+# the agent, so the exception may surface in the agent's finally blocks
+# or while it holds a lock. It cannot interrupt a C call (such as a NumPy
+# operation), and under Python 2 it may be up to 50ms late. Agents that
+# must clean up should poll timeRemaining() instead; a budget made with
+# interrupt=False relies on the check after each call alone.
+#
+import atexit
+import os
+import thread
+import threading
+
+def _monotonicClock():
+    """
+    The best monotonic clock available: time.monotonic, clock_gettime with
+    CLOCK_MONOTONIC through ctypes on Linux or, failing both, time.time.
+    """
+    if hasattr(time, 'monotonic'):
+        return time.monotonic
+    if not sys.platform.startswith('linux'):
+        return time.time
+    try:
+        import ctypes, ctypes.util
+        class timespec(ctypes.Structure):
+            _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+        class Buffers(threading.local):
+            "The timespec each thread reads the clock into."
+            def __init__(self):
+                self.spec = timespec()
+                self.reference = ctypes.byref(self.spec)
+        # PyDLL keeps the GIL during the call, which is cheaper than releasing it for so short a call
+        clock_gettime = ctypes.PyDLL(ctypes.util.find_library('rt') or ctypes.util.find_library('c')).clock_gettime
+        CLOCK_MONOTONIC = 1
+        if clock_gettime(CLOCK_MONOTONIC, Buffers().reference) != 0:
+            return time.time
+        def monotonic(buffers=Buffers()):
+            clock_gettime(CLOCK_MONOTONIC, buffers.reference)
+            spec = buffers.spec
+            return spec.tv_sec + spec.tv_nsec * 1e-9
+        return monotonic
+    except:
+        return time.time
+
+monotonicTime = _monotonicClock()
+
+try:
+    import ctypes
+    _SET_ASYNC_EXC = ctypes.pythonapi.PyThreadState_SetAsyncExc
+    _SET_ASYNC_EXC.argtypes = [ctypes.c_long, ctypes.py_object]
+except:
+    _SET_ASYNC_EXC = None
+
+class WatchedCall(object):
+    """
+    One TimeBudget call being watched: the thread making it, its deadline,
+    whether it still runs and whether the watchdog has fired at it. A call
+    made while another one runs in the same thread keeps that one as its
+    outer call.
+    """
+    __slots__ = ('ident', 'deadline', 'outer', 'running', 'fired')
+
+    def __init__(self, ident, deadline, outer):
+        self.ident = ident
+        self.deadline = deadline
+        self.outer = outer
+        self.running = True
+        self.fired = False
+
+class Watchdog:
+    """
+    A daemon thread that raises TimeoutFunctionException in the threads
+    whose TimeBudget call is still running past its deadline. Watching a
+    call takes no lock: the thread is only woken up for a deadline earlier
+    than the one it already sleeps until, and otherwise looks at the calls
+    every IDLE_TIME seconds. It is started on first use, and again in a
+    forked child process.
+    """
+    IDLE_TIME = 0.05
+
+    def __init__(self):
+        self.condition = threading.Condition(threading.Lock())
+        # the innermost running call of every thread
+        self.calls = {}
+        self.pid = None
+        self.watcher = None
+        self.stopped = False
+        # when the watchdog thread next wakes up by itself
+        self.wakeup = -1.0
+        # stop before the interpreter tears the modules down under the thread
+        atexit.register(self.stop)
+
+    def start(self):
+        self.condition.acquire()
+        try:
+            if self.pid == os.getpid(): return
+            self.pid = os.getpid()
+            self.calls = {}
+            self.stopped = False
+            self.wakeup = -1.0
+            self.watcher = threading.Thread(target=self.watch, name='Watchdog')
+            self.watcher.daemon = True
+            self.watcher.start()
+        finally:
+            self.condition.release()
+
+    def arm(self, deadline):
+        "Watches a call the calling thread is about to make, until deadline; returns its WatchedCall."
+        if self.pid != os.getpid(): self.start()
+        ident = thread.get_ident()
+        # an interrupt delivered before its call could disarm leaves the call behind, no longer running
+        outer = self.calls.get(ident)
+        while outer != None and not outer.running: outer = outer.outer
+        call = self.calls[ident] = WatchedCall(ident, deadline, outer)
+        if deadline < self.wakeup:
+            self.condition.acquire()
+            self.condition.notify()
+            self.condition.release()
+        return call
+
+    def disarm(self, call):
+        """
+        Stops watching a call that has stopped running and cancels its
+        interrupt if it was not delivered yet. Returns whether the call was
+        interrupted.
+        """
+        call.running = False
+        if call.outer != None:
+            self.calls[call.ident] = call.outer
+        else:
+            del self.calls[call.ident]
+        if not call.fired: return False
+        self.condition.acquire()
+        try:
+            if not call.fired: return False
+            call.fired = False
+            _SET_ASYNC_EXC(call.ident, ctypes.py_object())
+            return True
+        finally:
+            self.condition.release()
+
+    def stop(self):
+        "Ends the watchdog thread of this process, if it runs."
+        self.condition.acquire()
+        try:
+            if self.pid != os.getpid(): return
+            self.stopped = True
+            self.pid = None
+            self.condition.notify()
+        finally:
+            self.condition.release()
+        self.watcher.join()
+
+    def watch(self):
+        self.condition.acquire()
+        while not self.stopped:
+            now = monotonicTime()
+            wakeup = now + self.IDLE_TIME
+            for call in self.calls.values():
+                if not call.running: continue
+                if call.deadline > now:
+                    wakeup = min(wakeup, call.deadline)
+                    continue
+                # fired is set before running is read again, so a call that
+                # stops in between sees it and disarms under the lock
+                call.fired = True
+                if call.running:
+                    call.running = False
+                    _SET_ASYNC_EXC(call.ident, ctypes.py_object(TimeoutFunctionException))
+                else:
+                    call.fired = False
+            self.wakeup = wakeup
+            self.condition.wait(wakeup - now)
+        self.condition.release()
+
+_WATCHDOG = None
+if _SET_ASYNC_EXC != None:
+    _WATCHDOG = Watchdog()
+
+class _CurrentBudgets(threading.local):
+    "The budget of the move each thread is running, for timeRemaining()."
+    budget = None
+
+_CURRENT_BUDGETS = _CurrentBudgets()
+_NEVER = float('inf')
+
+class TimeBudget:
+    """
+    The time an agent may spend thinking, in seconds (floats, so limits
+    may be fractions of a second): moveTime per move and totalTime over
+    the game, either None for no limit. startMove() starts the clock of a
+    move, call() runs the agent within it and endMove() charges the move
+    to the total: from its start to the return of its last call. A move
+    ends at its deadline, the earlier of the end of moveTime and the end
+    of the total budget. With interrupt, calls running past the deadline
+    are interrupted by the watchdog (see above); every call is watched on
+    its own, so threads may share a budget.
+    """
+    def __init__(self, moveTime=None, totalTime=None, interrupt=True):
+        self.moveTime = moveTime
+        self.totalTime = totalTime
+        self.interrupt = interrupt and _WATCHDOG != None
+        self.used = 0.0
+        self.moveStart = None
+        self.returned = None
+        self.deadline = _NEVER
+
+    def startMove(self, moveTime=None):
+        "Starts a move of moveTime seconds, or of the budget's own moveTime."
+        if moveTime == None: moveTime = self.moveTime
+        self.moveStart = start = monotonicTime()
+        self.returned = None
+        deadline = _NEVER
+        if moveTime != None:
+            deadline = start + moveTime
+        if self.totalTime != None:
+            deadline = min(deadline, start + self.totalTime - self.used)
+        self.deadline = deadline
+
+    def endMove(self):
+        "Ends the move and returns its length in seconds."
+        end = self.returned
+        if end == None: end = monotonicTime()
+        elapsed = end - self.moveStart
+        self.used += elapsed
+        self.moveStart = None
+        self.deadline = _NEVER
+        return elapsed
+
+    def timeRemaining(self):
+        "Seconds left before the deadline of the move, or of the total budget between moves."
+        if self.moveStart != None:
+            return self.deadline - monotonicTime()
+        if self.totalTime != None:
+            return self.totalTime - self.used
+        return _NEVER
+
+    def exhausted(self):
+        "Whether the agent has spent its total budget (the running move included)."
+        if self.totalTime == None: return False
+        used = self.used
+        if self.moveStart != None: used += monotonicTime() - self.moveStart
+        return used >= self.totalTime
+
+    def call(self, function, *args, **keyArgs):
+        """
+        Calls function within the running move, as the budget timeRemaining()
+        answers for in this thread. Raises TimeoutFunctionException if the
+        call is still running at the deadline, or returns after it.
+        """
+        previous = _CURRENT_BUDGETS.budget
+        _CURRENT_BUDGETS.budget = self
+        try:
+            if self.interrupt and self.deadline != _NEVER:
+                watched = _WATCHDOG.arm(self.deadline)
+                try:
+                    result = function(*args, **keyArgs)
+                finally:
+                    if _WATCHDOG.disarm(watched):
+                        raise TimeoutFunctionException()
+            else:
+                result = function(*args, **keyArgs)
+        finally:
+            _CURRENT_BUDGETS.budget = previous
+        self.returned = returned = monotonicTime()
+        if returned > self.deadline:
+            raise TimeoutFunctionException()
+        return result
+
+def currentBudget():
+    "The TimeBudget of the move running in this thread, or None."
+    return _CURRENT_BUDGETS.budget
+
+def timeRemaining():
+    """
+    Seconds left for the move running in this thread; infinity when the
+    agent is not playing on a budget. Anytime agents poll it to stop early.
+    """
+    budget = _CURRENT_BUDGETS.budget
+    if budget == None: return _NEVER
+    return budget.timeRemaining()
+
 
 _ORIGINAL_STDOUT = None
 _ORIGINAL_STDERR = None
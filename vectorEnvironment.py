@@ -0,0 +1,345 @@
+# vectorEnvironment.py
+# --------------------
+# Many classic Pacman games stepped in lockstep with NumPy.
+#
+# A VectorEnvironment plays N independent games of one Layout. Instead of
+# a GameState object per game, the positions and directions of Pacman and
+# the ghosts, the scared timers, the food bitmaps, the capsules and the
+# scores of all the games live in arrays, and one step() moves Pacman and
+# then every ghost of every game that is still running, with the effects
+# of ClassicGameRules, PacmanRules and GhostRules (half-speed scared
+# ghosts, the collision tolerance, the time penalty, ...). The ghosts are
+# RandomGhosts unless their actions are given.
+#
+# checkEquivalence plays random games side by side with the reference
+# engine (GameState.generateSuccessor) and raises on the first difference:
+#
+#   python vectorEnvironment.py -l mediumClassic -n 64 -m 500
+
+import random
+import sys
+
+from game import Directions
+import layout
+import pacman
+
+try:
+    import numpy
+    _NUMPY_ENABLED = True
+except:
+    _NUMPY_ENABLED = False
+
+# actions are passed and returned as indices into ACTIONS
+ACTIONS = [Directions.NORTH, Directions.SOUTH, Directions.EAST, Directions.WEST, Directions.STOP]
+ACTION_INDICES = dict([(action, index) for index, action in enumerate(ACTIONS)])
+STOP = ACTION_INDICES[Directions.STOP]
+# the displacement and the reverse of every action, by index
+DX = [0, 0, 1, -1, 0]
+DY = [1, -1, 0, 0, 0]
+REVERSE = [1, 0, 3, 2, 4]
+
+class VectorEnvironment:
+    """
+    numEnvironments games of board played in lockstep. The state of game i
+    is row i of the arrays:
+
+      pacman           (N, 2) int     Pacman's cell
+      pacmanDirection  (N,)   int     the index of Pacman's direction
+      ghosts           (N, G, 2) float  ghost positions (half cells when scared)
+      ghostDirections  (N, G) int
+      scaredTimers     (N, G) int
+      food             (N, width, height) bool
+      capsules         (N, C) bool    whether each capsule of the layout is left
+      numFood, score, win, lose  (N,)
+
+    Games that are over are left alone by step() until they are reset.
+    """
+    def __init__(self, board, numEnvironments, numGhosts=None, seed=None):
+        if not _NUMPY_ENABLED:
+            raise Exception('VectorEnvironment needs NumPy')
+        self.layout = board
+        self.numEnvironments = numEnvironments
+        self.walls = numpy.array([[board.walls[x][y] for y in range(board.height)] for x in range(board.width)], dtype=bool)
+        self.startFood = numpy.array([[board.food[x][y] for y in range(board.height)] for x in range(board.width)], dtype=bool)
+        self.capsulePositions = list(board.capsules)
+        self.capsuleIndex = -numpy.ones((board.width, board.height), dtype=int)
+        for index, (x, y) in enumerate(self.capsulePositions):
+            self.capsuleIndex[x, y] = index
+        if numGhosts == None: numGhosts = board.getNumGhosts()
+        starts = [pos for isPacman, pos in board.agentPositions if isPacman]
+        ghostStarts = [pos for isPacman, pos in board.agentPositions if not isPacman][:numGhosts]
+        self.pacmanStart = numpy.array(starts[0], dtype=int)
+        self.ghostStarts = numpy.array(ghostStarts, dtype=float).reshape((len(ghostStarts), 2))
+        self.numGhosts = len(ghostStarts)
+        self.dx = numpy.array(DX)
+        self.dy = numpy.array(DY)
+        self.reverse = numpy.array(REVERSE)
+        self.random = numpy.random.RandomState(seed)
+
+        n, g = numEnvironments, self.numGhosts
+        self.pacman = numpy.zeros((n, 2), dtype=int)
+        self.pacmanDirection = numpy.zeros(n, dtype=int)
+        self.ghosts = numpy.zeros((n, g, 2))
+        self.ghostDirections = numpy.zeros((n, g), dtype=int)
+        self.scaredTimers = numpy.zeros((n, g), dtype=int)
+        self.food = numpy.zeros((n, board.width, board.height), dtype=bool)
+        self.capsules = numpy.zeros((n, len(self.capsulePositions)), dtype=bool)
+        self.numFood = numpy.zeros(n, dtype=int)
+        self.score = numpy.zeros(n)
+        self.win = numpy.zeros(n, dtype=bool)
+        self.lose = numpy.zeros(n, dtype=bool)
+        self.reset()
+
+    def reset(self, mask=None):
+        "Starts new games in the environments of mask (all of them by default); returns observe()."
+        if mask is None: mask = numpy.ones(self.numEnvironments, dtype=bool)
+        self.pacman[mask] = self.pacmanStart
+        self.pacmanDirection[mask] = STOP
+        self.ghosts[mask] = self.ghostStarts
+        self.ghostDirections[mask] = STOP
+        self.scaredTimers[mask] = 0
+        self.food[mask] = self.startFood
+        self.capsules[mask] = True
+        self.numFood[mask] = self.startFood.sum()
+        self.score[mask] = 0
+        self.win[mask] = False
+        self.lose[mask] = False
+        return self.observe()
+
+    def observe(self):
+        "The arrays of the games' state, by name (live arrays that step() changes)."
+        return {'pacman': self.pacman, 'pacmanDirection': self.pacmanDirection, 'ghosts': self.ghosts,
+                'ghostDirections': self.ghostDirections, 'scaredTimers': self.scaredTimers, 'food': self.food,
+                'capsules': self.capsules, 'score': self.score, 'win': self.win, 'lose': self.lose}
+
+    def done(self):
+        return self.win | self.lose
+
+    def legalActions(self):
+        "(N, 5) bool: the legal actions of Pacman in every game (PacmanRules.getLegalActions)."
+        x, y = self.pacman[:, 0], self.pacman[:, 1]
+        legal = numpy.ones((self.numEnvironments, len(ACTIONS)), dtype=bool)
+        for action in range(STOP):
+            legal[:, action] = ~self.walls[x + DX[action], y + DY[action]]
+        return legal
+
+    def ghostLegalActions(self, ghost, games=None):
+        """
+        (len(games), 5) bool: the legal actions of a ghost (GhostRules.getLegalActions).
+        Ghosts cannot stop nor turn around unless at a dead end, and a ghost
+        between two cells keeps going.
+        """
+        if games is None: games = numpy.arange(self.numEnvironments)
+        position = self.ghosts[games, ghost]
+        direction = self.ghostDirections[games, ghost]
+        legal = numpy.zeros((len(games), len(ACTIONS)), dtype=bool)
+        onGrid = (position == numpy.floor(position)).all(axis=1)
+        x = position[:, 0].astype(int)
+        y = position[:, 1].astype(int)
+        for action in range(STOP):
+            legal[onGrid, action] = ~self.walls[x[onGrid] + DX[action], y[onGrid] + DY[action]]
+        reverse = self.reverse[direction]
+        turnsAround = onGrid & (legal.sum(axis=1) > 1) & (reverse != STOP)
+        legal[numpy.nonzero(turnsAround)[0], reverse[turnsAround]] = False
+        offGrid = numpy.nonzero(~onGrid)[0]
+        legal[offGrid, direction[offGrid]] = True
+        return legal
+
+    def sampleActions(self, legal):
+        "One action drawn uniformly from the legal ones of each row of legal."
+        counts = legal.sum(axis=1)
+        draws = numpy.floor(self.random.random_sample(len(legal)) * counts)
+        return (legal.cumsum(axis=1) > draws[:, None]).argmax(axis=1)
+
+    def step(self, actions, ghostActions=None):
+        """
+        Moves Pacman with actions (one action index or direction per game) and
+        then every ghost, in the games that are not over, as consecutive
+        Game.run turns do. ghostActions, (N, G), fixes the ghosts' actions;
+        by default they move like RandomGhosts. Returns (observe(), the
+        change of score of every game, done()).
+        """
+        actions = actionIndices(actions)
+        score = self.score.copy()
+        games = numpy.nonzero(~self.done())[0]
+        if not self.legalActions()[games, actions[games]].all():
+            raise Exception('Illegal Pacman action')
+        self.movePacman(games, actions[games])
+        for ghost in range(self.numGhosts):
+            games = numpy.nonzero(~self.done())[0]
+            if len(games) == 0: break
+            legal = self.ghostLegalActions(ghost, games)
+            if ghostActions is None:
+                ghostAction = self.sampleActions(legal)
+            else:
+                ghostAction = actionIndices(numpy.asarray(ghostActions)[:, ghost])[games]
+                if not legal[numpy.arange(len(games)), ghostAction].all():
+                    raise Exception('Illegal ghost action')
+            self.moveGhost(ghost, games, ghostAction)
+        return self.observe(), self.score - score, self.done()
+
+    def movePacman(self, games, actions):
+        "PacmanRules.applyAction, the time penalty and GhostRules.checkDeath for Pacman."
+        x = self.pacman[games, 0] + self.dx[actions]
+        y = self.pacman[games, 1] + self.dy[actions]
+        self.pacman[games, 0] = x
+        self.pacman[games, 1] = y
+        moving = actions != STOP
+        self.pacmanDirection[games[moving]] = actions[moving]
+        scoreChange = numpy.zeros(len(games))
+
+        # Eat food
+        eaten = self.food[games, x, y]
+        self.food[games[eaten], x[eaten], y[eaten]] = False
+        self.numFood[games] -= eaten
+        scoreChange += 10 * eaten
+        won = eaten & (self.numFood[games] == 0)
+        scoreChange += 500 * won
+        self.win[games[won]] = True
+
+        # Eat capsule: reset all ghosts' scared timers
+        capsule = self.capsuleIndex[x, y]
+        hasCapsule = capsule >= 0
+        hasCapsule[hasCapsule] = self.capsules[games[hasCapsule], capsule[hasCapsule]]
+        self.capsules[games[hasCapsule], capsule[hasCapsule]] = False
+        self.scaredTimers[games[hasCapsule]] = pacman.SCARED_TIME
+
+        scoreChange -= pacman.TIME_PENALTY
+        for ghost in range(self.numGhosts):
+            scoreChange += self.checkDeath(ghost, games)
+        self.score[games] += scoreChange
+
+    def moveGhost(self, ghost, games, actions):
+        "GhostRules.applyAction, decrementTimer and checkDeath for one ghost."
+        timer = self.scaredTimers[games, ghost]
+        speed = numpy.where(timer > 0, 0.5, 1.0)
+        self.ghosts[games, ghost, 0] += self.dx[actions] * speed
+        self.ghosts[games, ghost, 1] += self.dy[actions] * speed
+        moving = actions != STOP
+        self.ghostDirections[games[moving], ghost] = actions[moving]
+        snapped = games[timer == 1]
+        self.ghosts[snapped, ghost] = numpy.floor(self.ghosts[snapped, ghost] + 0.5)
+        self.scaredTimers[games, ghost] = numpy.maximum(0, timer - 1)
+        self.score[games] += self.checkDeath(ghost, games)
+
+    def checkDeath(self, ghost, games):
+        """
+        GhostRules.collide for one ghost against Pacman: a scared ghost is
+        eaten and sent back to its start, otherwise Pacman loses (unless he
+        has just won). Returns the score change of every game.
+        """
+        distance = numpy.abs(self.ghosts[games, ghost] - self.pacman[games]).sum(axis=1)
+        caught = distance <= pacman.COLLISION_TOLERANCE
+        scared = self.scaredTimers[games, ghost] > 0
+        eaten = games[caught & scared]
+        self.ghosts[eaten, ghost] = self.ghostStarts[ghost]
+        self.ghostDirections[eaten, ghost] = STOP
+        self.scaredTimers[eaten, ghost] = 0
+        killed = caught & ~scared & ~self.win[games]
+        self.lose[games[killed]] = True
+        return 200.0 * (caught & scared) - 500.0 * killed
+
+def actionIndices(actions):
+    "Action indices from indices or directions."
+    actions = numpy.asarray(actions)
+    if actions.dtype.kind in 'SUO':
+        actions = numpy.array([ACTION_INDICES[action] for action in actions])
+    return actions.astype(int)
+
+def compareGame(environment, index, state):
+    "Raises if game index of environment differs from the GameState state."
+    differences = []
+    data = state.data
+    if tuple(environment.pacman[index]) != state.getPacmanPosition():
+        differences.append('Pacman is at %s instead of %s' % (tuple(environment.pacman[index]), state.getPacmanPosition()))
+    if ACTIONS[environment.pacmanDirection[index]] != state.getPacmanState().configuration.direction:
+        differences.append('Pacman faces %s' % ACTIONS[environment.pacmanDirection[index]])
+    for ghost, ghostState in enumerate(state.getGhostStates()):
+        if tuple(environment.ghosts[index, ghost]) != ghostState.getPosition():
+            differences.append('ghost %d is at %s instead of %s' % (ghost + 1, tuple(environment.ghosts[index, ghost]), ghostState.getPosition()))
+        if ACTIONS[environment.ghostDirections[index, ghost]] != ghostState.getDirection():
+            differences.append('ghost %d faces %s' % (ghost + 1, ACTIONS[environment.ghostDirections[index, ghost]]))
+        if environment.scaredTimers[index, ghost] != ghostState.scaredTimer:
+            differences.append('ghost %d is scared for %d' % (ghost + 1, environment.scaredTimers[index, ghost]))
+    food = [(x, y) for x, y in zip(*numpy.nonzero(environment.food[index]))]
+    if food != data.food.asList() or environment.numFood[index] != state.getNumFood():
+        differences.append('the food differs')
+    capsules = [position for position, left in zip(environment.capsulePositions, environment.capsules[index]) if left]
+    if sorted(capsules) != sorted(state.getCapsules()):
+        differences.append('the capsules differ')
+    if environment.score[index] != state.getScore():
+        differences.append('the score is %s instead of %s' % (environment.score[index], state.getScore()))
+    if environment.win[index] != state.isWin() or environment.lose[index] != state.isLose():
+        differences.append('the game is over: %s' % (environment.win[index] or environment.lose[index]))
+    if len(differences) > 0:
+        raise Exception('Game %d differs from the reference engine: %s' % (index, '; '.join(differences)))
+
+def checkEquivalence(board, numEnvironments=16, numSteps=500, seed=0):
+    """
+    Plays numEnvironments games of board with uniformly random Pacman and
+    ghost actions both in a VectorEnvironment and with GameState.
+    generateSuccessor, restarting finished games, and compares every game
+    after every step. Raises on the first difference; returns the number of
+    game steps compared.
+    """
+    generator = random.Random(seed)
+    environment = VectorEnvironment(board, numEnvironments, seed=seed)
+    numGhosts = environment.numGhosts
+
+    def newState():
+        state = pacman.GameState()
+        state.initialize(board, numGhosts)
+        return state
+    states = [newState() for i in range(numEnvironments)]
+    compared = 0
+    for step in range(numSteps):
+        legal = environment.legalActions()
+        actions = []
+        ghostActions = numpy.zeros((numEnvironments, numGhosts), dtype=int)
+        for index in range(numEnvironments):
+            state = states[index]
+            pacmanLegal = [ACTIONS[action] for action in range(len(ACTIONS)) if legal[index, action]]
+            if sorted(pacmanLegal) != sorted(state.getLegalActions(0)):
+                raise Exception('Game %d: Pacman can take %s instead of %s' % (index, pacmanLegal, state.getLegalActions(0)))
+            action = generator.choice(state.getLegalActions(0))
+            actions.append(action)
+            state = state.generateSuccessor(0, action)
+            for ghost in range(numGhosts):
+                if state.isWin() or state.isLose(): break
+                ghostAction = generator.choice(state.getLegalActions(ghost + 1))
+                ghostActions[index, ghost] = ACTION_INDICES[ghostAction]
+                state = state.generateSuccessor(ghost + 1, ghostAction)
+            states[index] = state
+        environment.step(actions, ghostActions)
+        for index in range(numEnvironments):
+            compareGame(environment, index, states[index])
+            compared += 1
+        finished = environment.done()
+        if finished.any():
+            environment.reset(finished)
+            for index in numpy.nonzero(finished)[0]:
+                states[index] = newState()
+    return compared
+
+def readCommand(argv):
+    from optparse import OptionParser
+    parser = OptionParser('USAGE: python vectorEnvironment.py <options>')
+    parser.add_option('-l', '--layout', dest='layout',
+                      help=pacman.default('the LAYOUT_FILE from which to load the map layout'), default='mediumClassic')
+    parser.add_option('-n', '--numEnvironments', dest='numEnvironments', type='int',
+                      help=pacman.default('the number of games played in lockstep'), default=16)
+    parser.add_option('-m', '--numSteps', dest='numSteps', type='int',
+                      help=pacman.default('the number of steps to compare'), default=500)
+    parser.add_option('-s', '--seed', dest='seed', type='int',
+                      help=pacman.default('the random seed of the actions'), default=0)
+    options, otherjunk = parser.parse_args(argv)
+    if len(otherjunk) != 0:
+        raise Exception('Command line input not understood: ' + str(otherjunk))
+    return options
+
+if __name__ == '__main__':
+    options = readCommand(sys.argv[1:])
+    board = layout.getLayout(options.layout)
+    if board == None: raise Exception("The layout " + options.layout + " cannot be found")
+    compared = checkEquivalence(board, options.numEnvironments, options.numSteps, options.seed)
+    print 'The vector environment matches the reference engine on %d game steps of %s' % (compared, options.layout)